@@ -3,13 +3,22 @@ from __future__ import annotations
 import csv
 import logging
 import re
-import time
 from pathlib import Path
-from typing import Optional, List
-import getpass
+from typing import Iterable, Iterator, Optional, List
 import typer
 
-from commons_client import CommonsClient, UploadInfo, valid_coordinates
+from commons_client import (
+    CommonsClient,
+    RateLimiter,
+    UploadInfo,
+    category_search_queries,
+    valid_coordinates,
+    BATCH_SIZE,
+    SEARCH_MAX_RESULTS,
+    DEFAULT_MAX_WORKERS,
+    FIELD_AUTHOR,
+    FIELD_EXIF_GPS,
+)
 
 app = typer.Typer(add_completion=False)
 
@@ -29,6 +38,13 @@ GPS_EXIF_LINE_RE = re.compile(
     r"(?mi)^\s*\{\{\s*GPS\s+EXIF[^}]*\}\}\s*\n?"
 )
 
+# Filtros do CirrusSearch: JPEGs sem nenhum template de localização.
+# hastemplate: resolve redirecionamentos ({{Location dec}} -> {{Location}} etc.)
+SEARCH_FILTERS = (
+    'filemime:image/jpeg -hastemplate:"Location" -hastemplate:"Camera location" '
+    '-hastemplate:"Object location" -hastemplate:"Coord"'
+)
+
 REDIRECT_RE = re.compile(r"(?i)^\s*#redirect\b", re.MULTILINE)
 FILEDESC_HEADING_RE = re.compile(r"(?im)^==\s*\{\{\s*int:filedesc\s*\}\}\s*==\s*$")
 
@@ -55,33 +71,13 @@ def read_titles_from_file(file_list: Path) -> List[str]:
     return titles
 
 
-def extract_exif_gps(client: CommonsClient, title: str):
+def exif_gps_of(upload: UploadInfo):
     """
-    Lê GPS do EXIF via API (imageinfo/metadata) e converte para float.
-    Usa o helper CommonsClient._get_lat_lon_gps.
+    GPS do EXIF já lido durante a listagem (imageinfo/metadata), sem nova chamada à API.
     """
-    data = client._site.api(
-        "query",
-        prop="imageinfo",
-        titles=f"File:{title}",
-        iiprop="metadata",
-        format="json",
-    )
-    if not data or "query" not in data or "pages" not in data["query"]:
-        return None, None
-
-    page = next(iter(data["query"]["pages"].values()))
-    imageinfo = page.get("imageinfo", [])
-    if not imageinfo:
+    if not valid_coordinates(upload.exif_lat, upload.exif_lon):
         return None, None
-
-    metadata = imageinfo[0].get("metadata", [])
-    lat = CommonsClient._get_lat_lon_gps("GPSLatitude", metadata)
-    lon = CommonsClient._get_lat_lon_gps("GPSLongitude", metadata)
-
-    if not valid_coordinates(lat, lon):
-        return None, None
-    return lat, lon
+    return upload.exif_lat, upload.exif_lon
 
 
 def has_gps_template(wikitext: str) -> bool:
@@ -121,38 +117,41 @@ def insert_after_filedesc_heading(wikitext: str, tpl: str) -> str:
 
     return prefix + tpl + suffix
 
+def search_queries(client: CommonsClient, category: str, max_depth: int) -> List[str]:
+    """
+    Consultas do CirrusSearch para a árvore da categoria (incategory: não é recursivo).
+    Com profundidade > 0, as subcategorias vêm do planejamento via categoryinfo.
+    """
+    if max_depth <= 0:
+        return category_search_queries([category], SEARCH_FILTERS)
+    plan = client.plan_category_tree(category, max_depth=max_depth)
+    for name in plan.listing_order():
+        if plan.files[name] > SEARCH_MAX_RESULTS:
+            logging.warning(
+                "Category:%s has %d files; search returns at most %d of them.",
+                name,
+                plan.files[name],
+                SEARCH_MAX_RESULTS,
+            )
+    queries = category_search_queries(plan.listing_order(), SEARCH_FILTERS, sizes=plan.files)
+    logging.info("Searching %d categories with %d queries.", len(plan.listing_order()), len(queries))
+    return queries
+
+
 def edit_page(
     client: CommonsClient,
     title: str,
     new_text: str,
     summary: str,
+    basetimestamp: Optional[str] = None,
 ) -> bool:
     full_title = title if title.startswith("File:") else f"File:{title}"
     try:
-        res = client._site.api(
-            "edit",
-            title=full_title,
-            text=new_text,
-            token=client._csrf_token,
-            summary=summary,
-            bot=True,
-            format="json",
-        )
+        return client.edit_page(full_title, new_text, summary, basetimestamp=basetimestamp)
     except Exception as exc:
         logging.error("Edit failed for %s: %s", full_title, exc)
         return False
 
-    if "error" in res:
-        logging.error("Edit error for %s: %s", full_title, res["error"])
-        return False
-
-    result = res.get("edit", {}).get("result")
-    if result != "Success":
-        logging.warning("Unexpected edit result for %s: %r", full_title, result)
-        return False
-
-    return True
-
 
 @app.command()
 def main(
@@ -163,7 +162,7 @@ def main(
         25, "--count", help="Max pages to modify"
     ),
     sleep: float = typer.Option(
-        5.0, "--sleep", help="Seconds to sleep between edits"
+        5.0, "--sleep", help="Minimum seconds between edits"
     ),
     category: Optional[str] = typer.Option(
         None, "--category", help="Scan a category instead of uploader"
@@ -179,7 +178,29 @@ def main(
     ),
     dry_run: bool = typer.Option(
         False, "--dry-run", help="Only list actions, do not edit pages"
-    )
+    ),
+    workers: int = typer.Option(
+        DEFAULT_MAX_WORKERS, "--workers", help="Metadata batches fetched concurrently while listing"
+    ),
+    generator: bool = typer.Option(
+        False, "--generator", help="Scan with API generators (listing and metadata in one request stream)"
+    ),
+    search: bool = typer.Option(
+        False, "--search", help="Category mode: ask CirrusSearch only for JPEGs without location templates"
+    ),
+    commons_user: str = typer.Option(
+        None,
+        "--commons-user",
+        envvar="COMMONS_USER",
+        prompt="Commons username",
+    ),
+    commons_pass: str = typer.Option(
+        None,
+        "--commons-pass",
+        envvar="COMMONS_PASS",
+        prompt=True,
+        hide_input=True,
+    ),
 ):
     """
     Adiciona {{Camera location dec}} usando GPS do EXIF quando:
@@ -192,66 +213,84 @@ def main(
         format="%(asctime)s %(levelname)s %(name)s: %(message)s",
     )
 
-    commons_user = input("Commons username: ")
-    commons_pass = getpass.getpass("Commons password: ")
+    # Opções inválidas antes de criar o cliente (login, pool, cache)
+    if search and (file_list or not category):
+        raise typer.Exit("--search needs --category (and no --file-list)")
 
-    client = CommonsClient(commons_user, commons_pass)
+    client = CommonsClient(
+        commons_user,
+        commons_pass,
+        max_workers=workers,
+        rate_limiter=RateLimiter(min_write_interval=sleep),
+    )
 
     try:
         target = target_user or commons_user
         # If --author-filter is provided as empty string, disable author filtering
         author = target if author_filter is None else author_filter
 
-        uploads: List[UploadInfo] = []
+        fields = {FIELD_EXIF_GPS}
+        if author:
+            fields.add(FIELD_AUTHOR)
 
+        uploads: Iterable[UploadInfo]
         if file_list:
             titles = read_titles_from_file(file_list)
-            uploads = client.fetch_uploads_for_titles(titles)
+            uploads = client.fetch_uploads_for_titles(titles, fields=fields)
+        elif search:
+            uploads = (u for u, _ in client.iter_search_files(search_queries(client, category, max_depth), fields=fields))
         elif category:
-            uploads = client.list_category_files(category, max_depth=max_depth)
+            uploads = (
+                u for u, _ in client.iter_category_files(
+                    category, max_depth=max_depth, fields=fields, generator=generator
+                )
+            )
         else:
-            uploads, _ = client.list_uploads(target)
+            uploads = (u for u, _ in client.iter_uploads(target, fields=fields, generator=generator))
 
-        total_listed = len(uploads)
-        skipped_non_jpeg = 0
-        skipped_author = 0
         skipped_redirect = 0
         skipped_has_template = 0
         skipped_no_gps_read = 0
+        wikitext_errors = 0
         gps_exif_present = 0
         gps_exif_removed = 0
-
-        # Filtro básico
-        filtered: List[UploadInfo] = []
-        for u in uploads:
-            if not u.title.lower().endswith((".jpg", ".jpeg")):
-                skipped_non_jpeg += 1
-                continue
-            if author and u.author and author.lower() not in u.author.lower():
-                skipped_author += 1
-                continue
-            filtered.append(u)
-
-        total_candidates = len(filtered)
-        max_to_process = min(total_candidates, count) if count > 0 else total_candidates
-        logging.info(
-            "Category/uploader returned %d items: %d non-JPEG, %d author-mismatch, %d remaining to check (processing up to %d).",
-            total_listed,
-            skipped_non_jpeg,
-            skipped_author,
-            total_candidates,
-            max_to_process,
-        )
-
+        listing = {"listed": 0, "non_jpeg": 0, "author": 0, "no_exif_gps": 0}
+
+        def candidates() -> Iterator[UploadInfo]:
+            # Filtro básico, aplicado enquanto a listagem chega
+            for u in uploads:
+                listing["listed"] += 1
+                if not u.title.lower().endswith((".jpg", ".jpeg")):
+                    listing["non_jpeg"] += 1
+                    continue
+                if author and u.author and author.lower() not in u.author.lower():
+                    listing["author"] += 1
+                    continue
+                # Sem GPS no EXIF não há o que adicionar: nem busca a wikitext
+                if not u.has_exif_gps:
+                    listing["no_exif_gps"] += 1
+                    continue
+                yield u
+
+        max_to_process = count if count > 0 else None
         edits_done = 0
         processed = 0
-        for upload in filtered:
-            if processed >= max_to_process:
+        # Wikitext is prefetched 50 pages per request (fewer when --count is smaller)
+        window = min(BATCH_SIZE, max_to_process) if max_to_process else BATCH_SIZE
+        for upload, rev in client.iter_with_wikitext(candidates(), window=window):
+            if max_to_process is not None and processed >= max_to_process:
                 break
 
-            logging.info("[%d/%d] Checking %s", processed + 1, max_to_process, upload.title)
+            logging.info("[%d/%s] Checking %s", processed + 1, max_to_process or "?", upload.title)
+
+            # Sem a wikitext atual (pedido falhou) não se edita: o texto vazio apagaria a página
+            if rev is None or not rev[2]:
+                logging.error("Skipping %s (could not read its current wikitext).", upload.title)
+                wikitext_errors += 1
+                processed += 1
+                continue
+            wikitext, _revid, rev_timestamp = rev
 
-            wikitext = client.fetch_wikitext(upload.title) or ""
             has_gps_exif_tpl = bool(GPS_EXIF_LINE_RE.search(wikitext))
             if has_gps_exif_tpl:
                 gps_exif_present += 1
@@ -267,7 +306,7 @@ def main(
                 processed += 1
                 continue
 
-            lat, lon = extract_exif_gps(client, upload.title)
+            lat, lon = exif_gps_of(upload)
             if lat is None or lon is None:
                 logging.info(
                     "Skipping %s (could not read EXIF GPS; upload.has_exif_gps=%s; GPS_EXIF_template=%s).",
@@ -297,6 +336,7 @@ def main(
                 upload.title,
                 new_text,
                 summary="Adding {{Camera location dec}} from EXIF GPS and removing {{GPS EXIF}} (bot).",
+                basetimestamp=rev_timestamp,
             )
             if ok:
                 logging.info(
@@ -309,25 +349,33 @@ def main(
                     gps_exif_removed += 1
                 edits_done += 1
                 processed += 1
-                time.sleep(sleep)
             else:
                 logging.error("Failed to edit %s", upload.title)
                 processed += 1
 
         logging.info(
-            "Done. Processed %d/%d candidates. Performed %d edits. Skipped: %d redirects, %d with existing location template, %d could not read EXIF GPS.",
+            "Listed %d items before stopping: %d non-JPEG, %d author-mismatch, %d without EXIF GPS.",
+            listing["listed"],
+            listing["non_jpeg"],
+            listing["author"],
+            listing["no_exif_gps"],
+        )
+        logging.info(
+            "Done. Processed %d/%s candidates. Performed %d edits. Skipped: %d redirects, %d with existing location template, %d could not read EXIF GPS, %d could not read wikitext.",
             processed,
-            max_to_process,
+            max_to_process or "all",
             edits_done,
             skipped_redirect,
             skipped_has_template,
             skipped_no_gps_read,
+            wikitext_errors,
         )
         logging.info(
             "GPS EXIF templates seen: %d; removed via edit: %d.",
             gps_exif_present,
             gps_exif_removed,
         )
+        logging.info("%s", client.stats_summary())
     finally:
         client.close()
 
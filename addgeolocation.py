@@ -7,9 +7,10 @@ import logging
 import csv
 import typer
 
-from commons_client import CommonsClient
-from processor import process_needs_exif
-from scanner import load_state, save_state, scan_user_uploads, ScanState
+from commons_client import CommonsClient, RateLimiter, DEFAULT_MAX_WORKERS
+from processor import DEFAULT_DOWNLOAD_WORKERS, DEFAULT_PREFETCH, process_needs_exif
+from scanner import describe_category_plan, load_state, save_state, scan_fields, scan_user_uploads, ScanState
+from watcher import DEFAULT_POLL_MAX, DEFAULT_POLL_MIN, watch_uploads
 
 app = typer.Typer(add_completion=False)
 
@@ -18,17 +19,27 @@ app = typer.Typer(add_completion=False)
 def main(
     target_user: str = typer.Option(None, "--target-user", help="Uploader to scan (defaults to login user)"),
     count: int = typer.Option(19, "--count", help="Max edits to perform"),
-    sleep: float = typer.Option(10.0, "--sleep", help="Base sleep seconds"),
+    sleep: float = typer.Option(10.0, "--sleep", help="Minimum seconds between uploads"),
     max_edits_per_min: int = typer.Option(30, "--max-edits-per-min", help="Max edits per minute"),
-    state_file: Path = typer.Option(Path("gps_scan.json"), "--state-file", help="Path to save scan results"),
+    state_file: Path = typer.Option(Path("gps_scan.db"), "--state-file", help="SQLite scan state (an existing .json state is imported once)"),
     upload: bool = typer.Option(False, "--upload", help="Upload modified files back to Commons"),
     download_dir: Optional[Path] = typer.Option(None, "--download-dir", help="Directory to store downloads (defaults to temp)"),
     resume: bool = typer.Option(True, "--resume/--no-resume", help="Reuse existing scan file if present"),
     dry_run: bool = typer.Option(False, "--dry-run", help="Only list actions, do not modify files"),
     category: Optional[str] = typer.Option(None, "--category", help="Scan a category instead of uploader"),
     max_depth: int = typer.Option(1, "--max-depth", help="Category recursion depth"),
+    plan: bool = typer.Option(False, "--plan", help="Size the category tree first (categoryinfo): skips empty categories, gives a progress total/ETA"),
+    plan_only: bool = typer.Option(False, "--plan-only", help="Print the category plan and exit without scanning"),
     author_filter: Optional[str] = typer.Option(None, "--author-filter", help="Filter by author name (defaults to target user)"),
     file_list: Optional[Path] = typer.Option(None, "--file-list", help="Process a specific list of files (CSV/plain)"),
+    workers: int = typer.Option(DEFAULT_MAX_WORKERS, "--workers", help="Metadata batches fetched concurrently while scanning"),
+    download_workers: int = typer.Option(DEFAULT_DOWNLOAD_WORKERS, "--download-workers", help="Originals downloaded concurrently while processing"),
+    prefetch: int = typer.Option(DEFAULT_PREFETCH, "--prefetch", help="Downloaded files queued ahead of the upload stage"),
+    cache_file: Optional[Path] = typer.Option(None, "--cache-file", help="SQLite cache of page metadata/wikitext, revalidated by revision id (off by default)"),
+    generator: bool = typer.Option(False, "--generator", help="Scan with API generators (listing and metadata in one request stream)"),
+    watch: bool = typer.Option(False, "--watch", help="Keep running: poll for new uploads and process them as they appear"),
+    poll_min: float = typer.Option(DEFAULT_POLL_MIN, "--poll-min", help="Watch mode: seconds between polls after new uploads"),
+    poll_max: float = typer.Option(DEFAULT_POLL_MAX, "--poll-max", help="Watch mode: longest wait between polls while idle"),
     commons_user: str = typer.Option(
         None,
         "--commons-user",
@@ -50,10 +61,46 @@ def main(
     )
     target = target_user or commons_user
     author = author_filter or target
+    if watch and (category or file_list or dry_run):
+        raise typer.Exit("--watch follows an uploader; it cannot be combined with --category, --file-list or --dry-run")
+    if watch and not upload:
+        # Without uploads every cycle would patch files locally and mark them done.
+        raise typer.Exit("--watch needs --upload")
 
-    client = CommonsClient(commons_user, commons_pass, download_dir=str(download_dir) if download_dir else None)
+    client = CommonsClient(
+        commons_user,
+        commons_pass,
+        download_dir=str(download_dir) if download_dir else None,
+        max_workers=workers,
+        cache_path=str(cache_file) if cache_file else None,
+        rate_limiter=RateLimiter(writes_per_min=max_edits_per_min, min_write_interval=sleep),
+    )
     state = load_state(state_file) if resume else ScanState()
 
+    if watch:
+        updated, skipped_has_gps, skipped_no_gps, errors = watch_uploads(
+            client,
+            target,
+            state,
+            state_file,
+            count=count,
+            upload=upload,
+            author_filter=author,
+            generator=generator,
+            download_workers=download_workers,
+            prefetch=prefetch,
+            poll_min=poll_min,
+            poll_max=poll_max,
+        )
+        print(
+            f"Watch finished. Updated: {updated}, skipped (has GPS): {skipped_has_gps}, "
+            f"skipped (no GPS source): {skipped_no_gps}, errors: {errors}."
+        )
+        print(client.stats_summary())
+        state.close()
+        client.close()
+        return
+
     if file_list:
         titles = []
         title_oldid = {}
@@ -76,7 +123,7 @@ def main(
                     title = line.strip()
                     if title:
                         titles.append(title)
-        uploads = client.fetch_uploads_for_titles(titles)
+        uploads = client.fetch_uploads_for_titles(titles, fields=scan_fields(author))
         # apply author filter and JPEG only
         filtered = []
         for u in uploads:
@@ -87,11 +134,32 @@ def main(
             if title_oldid.get(u.title):
                 u.oldid = title_oldid[u.title]
             filtered.append(u)
-        state.needs_exif = [u for u in filtered if u.has_coords and not u.has_exif_gps]
-        state.needs_template = [u.title for u in filtered if u.has_exif_gps and not u.has_coords]
+        state.replace(
+            needs_exif=[u for u in filtered if u.has_coords and not u.has_exif_gps],
+            needs_template=[u.title for u in filtered if u.has_exif_gps and not u.has_coords],
+        )
         save_state(state_file, state)
     else:
-        state = scan_user_uploads(client, target, state, state_file, category=category, max_depth=max_depth, author_filter=author)
+        category_plan = None
+        if category and (plan or plan_only):
+            category_plan = client.plan_category_tree(category, max_depth=max_depth)
+            for line in describe_category_plan(category_plan):
+                print(line)
+            if plan_only:
+                state.close()
+                client.close()
+                return
+        state = scan_user_uploads(
+            client,
+            target,
+            state,
+            state_file,
+            category=category,
+            max_depth=max_depth,
+            author_filter=author,
+            generator=generator,
+            plan=category_plan,
+        )
 
     print(
         f"Uploads for {target}: {len(state.needs_exif)} need EXIF GPS, "
@@ -102,6 +170,8 @@ def main(
 
     if dry_run:
         print("Dry run: exiting without modifications.")
+        print(client.stats_summary())
+        state.close()
         client.close()
         return
 
@@ -110,15 +180,17 @@ def main(
         state=state,
         state_path=state_file,
         count=count,
-        base_sleep=sleep,
-        max_edits_per_min=max_edits_per_min,
         upload=upload,
+        download_workers=download_workers,
+        prefetch=prefetch,
     )
     save_state(state_file, state)
     print(
         f"Finished. Updated: {updated}, skipped (has GPS): {skipped_has_gps}, "
         f"skipped (no GPS source): {skipped_no_gps}, errors: {errors}."
     )
+    print(client.stats_summary())
+    state.close()
     client.close()
 
 
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = 200_000
+
+
+class ApiCache:
+    """SQLite store of per-page API results, valid while the page's lastrevid is unchanged.
+
+    Entries are keyed by (kind, title); ``kind`` separates result types such as
+    imageinfo projections, wikitext and SDC captions. Least recently read entries are
+    evicted once the table grows beyond ``max_entries``.
+    """
+
+    def __init__(self, path: Path, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = Path(path)
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                kind TEXT NOT NULL,
+                title TEXT NOT NULL,
+                revid INTEGER NOT NULL,
+                value TEXT NOT NULL,
+                accessed REAL NOT NULL,
+                PRIMARY KEY (kind, title)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get_many(self, kind: str, revids: Dict[str, int]) -> Dict[str, Any]:
+        """Return cached values for titles whose stored revid matches ``revids``."""
+        if not revids:
+            return {}
+        found: Dict[str, Any] = {}
+        titles = list(revids)
+        with self._lock:
+            for i in range(0, len(titles), 500):
+                chunk = titles[i : i + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT title, revid, value FROM entries WHERE kind = ? AND title IN ({marks})",
+                    [kind, *chunk],
+                ).fetchall()
+                for title, revid, value in rows:
+                    if revid == revids[title]:
+                        found[title] = json.loads(value)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE entries SET accessed = ? WHERE kind = ? AND title = ?",
+                    [(now, kind, title) for title in found],
+                )
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(revids) - len(found)
+        return found
+
+    def get(self, kind: str, title: str, revid: int) -> Optional[Any]:
+        return self.get_many(kind, {title: revid}).get(title)
+
+    def put_many(self, kind: str, items: Iterable[Tuple[str, int, Any]]):
+        rows = [(kind, title, revid, json.dumps(value), time.time()) for title, revid, value in items]
+        if not rows:
+            return
+        with self._lock:
+            existing = 0
+            for i in range(0, len(rows), 500):
+                chunk = [row[1] for row in rows[i : i + 500]]
+                marks = ",".join("?" * len(chunk))
+                existing += self._conn.execute(
+                    f"SELECT COUNT(*) FROM entries WHERE kind = ? AND title IN ({marks})",
+                    [kind, *chunk],
+                ).fetchone()[0]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (kind, title, revid, value, accessed) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._count += len(rows) - existing
+            if self._count > self.max_entries:
+                excess = self._count - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries ORDER BY accessed LIMIT ?)",
+                    (excess,),
+                )
+                self._count -= excess
+            self._conn.commit()
+
+    def put(self, kind: str, title: str, revid: int, value: Any):
+        self.put_many(kind, [(title, revid, value)])
@@ -0,0 +1,110 @@
+"""Time to set and remove EXIF GPS: piexif load/dump versus the minimal GPS IFD editor.
+
+Both paths only see the EXIF payload (the JPEG head is split off with
+jpeg_exif.read_head), so the numbers compare the EXIF encoders alone. Without
+``--corpus`` the JPEGs are synthetic, with a large maker note and user comment
+like the ones camera firmware writes.
+
+    python benchmarks/bench_exif_gps.py --files 200
+    python benchmarks/bench_exif_gps.py --corpus ~/Pictures/sample
+"""
+from __future__ import annotations
+
+import io
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import piexif
+import typer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import jpeg_exif  # noqa: E402
+
+app = typer.Typer(add_completion=False)
+
+
+def synthetic(n: int, maker_note: int, seed: int = 1) -> List[bytes]:
+    from PIL import Image
+
+    rng = random.Random(seed)
+    buf = io.BytesIO()
+    Image.new("RGB", (320, 240), (90, 120, 150)).save(buf, "JPEG")
+    plain = buf.getvalue()
+    payloads = []
+    for i in range(n):
+        exif = {
+            "0th": {piexif.ImageIFD.Make: b"Camera", piexif.ImageIFD.Model: f"Model {i % 7}".encode()},
+            "Exif": {
+                piexif.ExifIFD.DateTimeOriginal: b"2024:05:01 12:00:00",
+                piexif.ExifIFD.MakerNote: rng.randbytes(maker_note),
+                piexif.ExifIFD.UserComment: b"ASCII\x00\x00\x00" + b"x" * 2000,
+            },
+            "GPS": {},
+            "1st": {},
+            "thumbnail": None,
+        }
+        data, _ = jpeg_exif.rewrite_exif_bytes(plain, lambda _old, exif=exif: piexif.dump(exif))
+        payloads.append(data)
+    return payloads
+
+
+def exif_payload(data: bytes) -> Optional[bytes]:
+    head, start, end = jpeg_exif.read_head(io.BytesIO(data))
+    return head[start + 4 : end] if end > start else None
+
+
+def piexif_set(payload: Optional[bytes], lat: float, lon: float) -> bytes:
+    return jpeg_exif._piexif_set_gps(payload, lat, lon)
+
+
+def piexif_remove(payload: Optional[bytes]) -> Optional[bytes]:
+    return jpeg_exif._piexif_remove_gps(payload) if payload else payload
+
+
+def run(name: str, fn: Callable[[Optional[bytes]], Optional[bytes]], payloads: List[Optional[bytes]], repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for payload in payloads:
+            fn(payload)
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:16s} {best / len(payloads) * 1e6:9.1f} us/file")
+
+
+@app.command()
+def main(
+    files: int = typer.Option(200, "--files", help="Synthetic JPEGs to generate"),
+    maker_note: int = typer.Option(30_000, "--maker-note", help="Maker note bytes in synthetic JPEGs"),
+    corpus: Optional[Path] = typer.Option(None, "--corpus", help="Directory of real JPEGs to use instead"),
+    repeat: int = typer.Option(5, "--repeat", help="Runs per method; the fastest is reported"),
+):
+    if corpus:
+        jpegs = [p.read_bytes() for p in sorted(corpus.iterdir()) if p.suffix.lower() in (".jpg", ".jpeg")]
+    else:
+        jpegs = synthetic(files, maker_note)
+    payloads = [exif_payload(data) for data in jpegs]
+    lat, lon = 38.7223, -9.1393
+
+    # Both writers must agree on what the file ends up with.
+    for payload in payloads:
+        minimal = piexif.load(jpeg_exif.set_gps_tiff(payload, lat, lon))
+        reference = piexif.load(piexif_set(payload, lat, lon))
+        for tag in (1, 2, 3, 4):
+            assert minimal["GPS"][tag] == reference["GPS"][tag]
+        assert minimal["0th"].get(piexif.ImageIFD.Make) == reference["0th"].get(piexif.ImageIFD.Make)
+        assert not piexif.load(jpeg_exif.remove_gps_tiff(jpeg_exif.set_gps_tiff(payload, lat, lon)))["GPS"]
+
+    with_gps = [jpeg_exif.set_gps_tiff(payload, lat, lon) for payload in payloads]
+    print(f"{len(payloads)} files, mean EXIF payload {sum(len(p or b'') for p in payloads) / len(payloads):,.0f} bytes")
+    run("piexif set", lambda p: piexif_set(p, lat, lon), payloads, repeat)
+    run("minimal set", lambda p: jpeg_exif.set_gps_tiff(p, lat, lon), payloads, repeat)
+    run("piexif remove", piexif_remove, with_gps, repeat)
+    run("minimal remove", jpeg_exif.remove_gps_tiff, with_gps, repeat)
+
+
+if __name__ == "__main__":
+    app()
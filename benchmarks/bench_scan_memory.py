@@ -0,0 +1,98 @@
+"""Bytes per file held by a synthetic scan: UploadInfo records plus the seen-title set.
+
+Compares the old layout (plain dataclass, per-file author and URL strings, a set
+of full titles) with the current one (slotted UploadInfo, interned authors, no
+stored URL, TitleSet).
+
+    python benchmarks/bench_scan_memory.py --files 1000000
+"""
+from __future__ import annotations
+
+import gc
+import random
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+import typer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from commons_client import TitleSet, UploadInfo, _intern  # noqa: E402
+
+app = typer.Typer(add_completion=False)
+
+
+@dataclass
+class LegacyUploadInfo:
+    """UploadInfo as it was before slots: same fields, one __dict__ per instance."""
+
+    title: str
+    has_coords: bool
+    has_exif_gps: bool
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    url: Optional[str] = None
+    author: Optional[str] = None
+    oldid: Optional[int] = None
+    description: Optional[str] = None
+    exif_lat: Optional[float] = None
+    exif_lon: Optional[float] = None
+
+
+def synthetic(n: int, seed: int = 1):
+    rng = random.Random(seed)
+    for i in range(n):
+        title = f"Trip to somewhere {i // 500} - IMG_{i:08d}.jpg"
+        has_coords = rng.random() < 0.7
+        # Authors come from parsed API JSON, so each file carries its own copy of the string.
+        author = f"Photographer {rng.randrange(20)}"
+        yield (
+            title,
+            has_coords,
+            rng.random() < 0.3,
+            rng.uniform(-90, 90) if has_coords else None,
+            rng.uniform(-180, 180) if has_coords else None,
+            f"https://upload.wikimedia.org/wikipedia/commons/{i % 16:x}/{i % 256:02x}/{title.replace(' ', '_')}",
+            author,
+        )
+
+
+def legacy_scan(n: int):
+    records, seen = [], set()
+    for title, has_coords, has_exif, lat, lon, url, author in synthetic(n):
+        records.append(LegacyUploadInfo(title, has_coords, has_exif, lat, lon, url, author))
+        seen.add(title)
+    return records, seen
+
+
+def compact_scan(n: int):
+    records, seen = [], TitleSet()
+    for title, has_coords, has_exif, lat, lon, _url, author in synthetic(n):
+        # Scans no longer keep the original's URL; download_with_gps derives it from the title.
+        records.append(UploadInfo(title, has_coords, has_exif, lat, lon, None, _intern(author)))
+        seen.add(title)
+    return records, seen
+
+
+def measure(build: Callable[[int], object], n: int) -> int:
+    gc.collect()
+    tracemalloc.start()
+    kept = build(n)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return current
+
+
+@app.command()
+def main(files: int = typer.Option(1_000_000, "--files", help="Synthetic files to scan")):
+    for name, build in (("legacy", legacy_scan), ("compact", compact_scan)):
+        used = measure(build, files)
+        print(f"{name:8s} {used / files:8.1f} bytes/file  ({used / 2**20:8.1f} MiB for {files:,} files)")
+
+
+if __name__ == "__main__":
+    app()
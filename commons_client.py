@@ -1,20 +1,83 @@
 from __future__ import annotations
 
+import hashlib
+import io
+import json
 import os
+import sys
 import tempfile
+import threading
 import time
 import logging
-from dataclasses import dataclass, asdict
+import random
+from array import array
+from bisect import bisect_left
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict, field
 from pathlib import Path
-from random import randrange
-from typing import Any, Dict, Iterable, List, Optional, Tuple, Set
+from typing import Any, BinaryIO, Callable, Deque, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple, Set, TypeVar, Union
 
 import mwclient
-import piexif
 import requests
+from requests.adapters import HTTPAdapter
 from PIL import Image
 from GPSPhoto import gpsphoto  # noqa: F401  # kept for reference/future use
+
+import jpeg_exif
+from api_cache import ApiCache, DEFAULT_MAX_ENTRIES
 from fractions import Fraction
+from itertools import islice
+from urllib.parse import quote
+
+# The API accepts at most 50 titles per query for regular accounts.
+BATCH_SIZE = 50
+DEFAULT_MAX_WORKERS = 4
+
+# UploadInfo fields a caller can ask the metadata queries to fill. Fields that are
+# not requested are neither fetched nor parsed and keep their defaults.
+FIELD_COORDS = "coords"  # has_coords, lat, lon (prop=coordinates)
+FIELD_EXIF_GPS = "exif_gps"  # has_exif_gps, exif_lat, exif_lon (iiprop=metadata, the full EXIF blob)
+FIELD_URL = "url"  # url of the current original
+FIELD_AUTHOR = "author"  # extmetadata Artist/Author
+FIELD_DESCRIPTION = "description"  # extmetadata Description (HTML)
+ALL_FIELDS: FrozenSet[str] = frozenset(
+    {FIELD_COORDS, FIELD_EXIF_GPS, FIELD_URL, FIELD_AUTHOR, FIELD_DESCRIPTION}
+)
+
+COMMONS_HOST = "commons.wikimedia.org"
+UPLOAD_HOST = "upload.wikimedia.org"
+USER_AGENT = "AddGeoLocationBot/1.0 (https://github.com/wilfredor/addwikigeolocation; wilfredor@gmail.com)"
+
+# Cookies and CSRF token are kept here between runs so short jobs skip login.
+DEFAULT_SESSION_FILE = "~/.cache/addwikigeolocation/session-{user}.json"
+# API errors after which the session is re-established once before giving up.
+SESSION_ERROR_CODES = {"badtoken", "notloggedin", "assertuserfailed", "assertbotfailed"}
+
+# Originals up to this size are held in memory between download and upload.
+SPOOL_MAX_BYTES = 32 * 2**20
+DOWNLOAD_CHUNK = 64 * 1024
+# Leading bytes fetched to read a JPEG's EXIF segment without downloading the image.
+PROBE_BYTES = 128 * 1024
+
+# CirrusSearch rejects longer queries and stops paging after 10,000 results.
+SEARCH_MAX_QUERY = 300
+SEARCH_MAX_RESULTS = 10_000
+
+# Request budgets shared by every worker of a client. Reads cover API queries and
+# original downloads, writes cover edits and uploads.
+DEFAULT_READS_PER_MIN = 600
+DEFAULT_WRITES_PER_MIN = 30
+# Ask the API to refuse requests while replica lag exceeds this many seconds.
+DEFAULT_MAXLAG = 5
+# Pause applied when the server rejects a request without saying how long to wait.
+DEFAULT_BACKOFF = 5.0
+
+T = TypeVar("T")
+
+# Current page text with the revision id and timestamp it was read at.
+WikitextRevision = Tuple[str, Optional[int], Optional[str]]
 
 
 def decimal_to_dms(deg: float):
@@ -27,43 +90,38 @@ def decimal_to_dms(deg: float):
 
 
 def set_gps_location(file_path: Path, lat: float, lng: float):
-    """Adds GPS coordinates as EXIF metadata to an image file."""
-    lat_deg = decimal_to_dms(lat)
-    lng_deg = decimal_to_dms(lng)
+    """Adds GPS coordinates as EXIF metadata to an image file.
 
-    lat_sec = min(max(lat_deg[2], 0), 60)
-    lng_sec = min(max(lng_deg[2], 0), 60)
+    Reads the file once and replaces it with the patched copy; only the EXIF
+    segment is decoded (see jpeg_exif).
+    """
+    file_path = Path(file_path)
+    tmp_path = file_path.with_name(file_path.name + ".tmp")
+    with open(file_path, "rb") as src, open(tmp_path, "wb") as dst:
+        jpeg_exif.rewrite_exif(src, dst, jpeg_exif.set_gps_edit(lat, lng))
+    os.replace(tmp_path, file_path)
 
-    lat_ref = "N" if lat_deg[0] >= 0 else "S"
-    lng_ref = "E" if lng_deg[0] >= 0 else "W"
 
-    gps_ifd = {
-        piexif.GPSIFD.GPSLatitude: (
-            (abs(lat_deg[0]), 1),
-            (abs(lat_deg[1]), 1),
-            (int(abs(lat_sec) * 1000), 1000),
-        ),
-        piexif.GPSIFD.GPSLatitudeRef: lat_ref,
-        piexif.GPSIFD.GPSLongitude: (
-            (abs(lng_deg[0]), 1),
-            (abs(lng_deg[1]), 1),
-            (int(abs(lng_sec) * 1000), 1000),
-        ),
-        piexif.GPSIFD.GPSLongitudeRef: lng_ref,
-    }
-
-    file_str = str(file_path)
-    exif_dict = piexif.load(file_str)
-    exif_dict["GPS"] = gps_ifd
-    exif_bytes = piexif.dump(exif_dict)
-    piexif.insert(exif_bytes, file_str)
+@contextmanager
+def _open_for_upload(source: Union[Path, str, BinaryIO]) -> Iterator[BinaryIO]:
+    """Yield ``source`` ready to be read from the start; paths are opened and closed here."""
+    if isinstance(source, (str, Path)):
+        with open(source, "rb") as fh:
+            yield fh
+    else:
+        source.seek(0)
+        yield source
 
 
 def valid_coordinates(lat: Optional[float], lon: Optional[float]) -> bool:
     return lat is not None and lon is not None and -90 <= lat <= 90 and -180 <= lon <= 180
 
 
-@dataclass
+# Slotted records drop the per-instance __dict__ (about 100 bytes per file) where supported.
+_DATACLASS_SLOTS: Dict[str, Any] = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_DATACLASS_SLOTS)
 class UploadInfo:
     title: str
     has_coords: bool
@@ -74,6 +132,11 @@ class UploadInfo:
     author: Optional[str] = None
     oldid: Optional[int] = None
     description: Optional[str] = None
+    # GPS position recorded in the file's EXIF, as opposed to the page coordinates above.
+    exif_lat: Optional[float] = None
+    exif_lon: Optional[float] = None
+    # No coordinates found, but the metadata was missing or had other GPS tags; only the file can tell.
+    exif_gps_uncertain: bool = False
 
     def to_dict(self) -> Dict[str, Any]:
         return asdict(self)
@@ -89,30 +152,402 @@ class UploadInfo:
             lat=data.get("lat"),
             lon=data.get("lon"),
             url=data.get("url"),
-            author=data.get("author"),
+            author=_intern(data.get("author")),
             oldid=data.get("oldid"),
             description=data.get("description"),
+            exif_lat=data.get("exif_lat"),
+            exif_lon=data.get("exif_lon"),
+            exif_gps_uncertain=data.get("exif_gps_uncertain", False),
+        )
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    """Share one string object per distinct value; an uploader's files mostly repeat one author."""
+    return sys.intern(value) if value else value
+
+
+def original_file_url(title: str) -> str:
+    """URL of a file's current original, derived from its name like MediaWiki's hashed upload paths."""
+    name = title.split(":", 1)[1] if title.startswith("File:") else title
+    name = name.replace(" ", "_")
+    digest = hashlib.md5(name.encode("utf-8")).hexdigest()
+    return f"https://{UPLOAD_HOST}/wikipedia/commons/{digest[0]}/{digest[:2]}/{quote(name)}"
+
+
+class TitleSet:
+    """Set of page titles stored as 64-bit BLAKE2b digests.
+
+    Membership costs 8 bytes per title in a sorted array instead of a full string
+    in a hash set (roughly 100+ bytes each). Recent additions sit in a small set
+    that is merged into the array in bulk. At a million titles the chance of any
+    digest collision is about 3e-8; a collision would only skip one file.
+
+    File titles are compared in one form, so listings ("File:A_b.jpg") and
+    stored records ("A b.jpg") match.
+    """
+
+    _MERGE_AT = 65536
+
+    def __init__(self, titles: Optional[Iterable[str]] = None):
+        self._sorted = array("Q")
+        self._recent: Set[int] = set()
+        if isinstance(titles, TitleSet):
+            self._sorted = array("Q", titles._sorted)
+            self._recent = set(titles._recent)
+        elif titles:
+            for title in titles:
+                self.add(title)
+
+    @staticmethod
+    def _key(title: str) -> int:
+        if title.startswith("File:"):
+            title = title[5:]
+        title = title.replace("_", " ")
+        return int.from_bytes(hashlib.blake2b(title.encode("utf-8"), digest_size=8).digest(), "little")
+
+    def _has(self, key: int) -> bool:
+        if key in self._recent:
+            return True
+        i = bisect_left(self._sorted, key)
+        return i < len(self._sorted) and self._sorted[i] == key
+
+    def __contains__(self, title: object) -> bool:
+        return isinstance(title, str) and self._has(self._key(title))
+
+    def add(self, title: str):
+        key = self._key(title)
+        if self._has(key):
+            return
+        self._recent.add(key)
+        if len(self._recent) >= self._MERGE_AT:
+            self._merge()
+
+    def update(self, titles: Iterable[str]):
+        for title in titles:
+            self.add(title)
+
+    def _merge(self):
+        merged = array("Q", self._sorted)
+        merged.extend(self._recent)
+        self._sorted = array("Q", sorted(merged))
+        self._recent = set()
+
+    def __len__(self) -> int:
+        return len(self._sorted) + len(self._recent)
+
+
+def _category_name(title: str) -> str:
+    name = title.split(":", 1)[1] if title.startswith("Category:") else title
+    return name.replace("_", " ")
+
+
+# (file members, subcategory names, continuation of the next page)
+CategoryPage = Tuple[List[Any], List[str], Optional[dict]]
+
+
+@dataclass
+class CategoryFrontier:
+    """Traversal state of a category tree walk.
+
+    ``pending`` holds (category, depth, continuation) entries still to list, with
+    O(1) pops from the left; ``visited`` holds every category ever queued, so
+    cycles and categories reached through several parents are listed once.
+    """
+
+    pending: Deque[Tuple[str, int, Optional[dict]]] = field(default_factory=deque)
+    visited: Set[str] = field(default_factory=set)
+
+    @classmethod
+    def start(cls, category: str) -> "CategoryFrontier":
+        root = _category_name(category)
+        return cls(pending=deque([(root, 0, None)]), visited={root})
+
+    @classmethod
+    def from_plan(cls, plan: CategoryPlan) -> "CategoryFrontier":
+        """Queue only the planned categories that hold files; every planned category counts as visited."""
+        return cls(
+            pending=deque((category, plan.depth[category], None) for category in plan.listing_order()),
+            visited=set(plan.depth),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "pending": [[category, depth, cont] for category, depth, cont in self.pending],
+            "visited": sorted(self.visited),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CategoryFrontier":
+        return cls(
+            pending=deque((category, depth, cont) for category, depth, cont in data.get("pending", [])),
+            visited=set(data.get("visited", [])),
+        )
+
+    def advance(self, batch: List[Tuple[str, int, Optional[dict]]], pages: List[CategoryPage], max_depth: int):
+        """Replace the listed ``batch`` entries with their next pages and new subcategories."""
+        for _ in batch:
+            self.pending.popleft()
+        for (category, depth, _), (_, subcats, next_cont) in zip(batch, pages):
+            if next_cont:
+                self.pending.append((category, depth, next_cont))
+            if depth >= max_depth:
+                continue
+            for sub in subcats:
+                if sub not in self.visited:
+                    self.visited.add(sub)
+                    self.pending.append((sub, depth + 1, None))
+
+
+@dataclass
+class CategoryPlan:
+    """Sizes of a category tree from ``prop=categoryinfo``, gathered before listing.
+
+    ``files`` and ``subcats`` are the per-category member counts the API reports;
+    files in several categories are counted in each, so ``total_files`` is an
+    upper bound. ``branch_files`` sums ``files`` over each category's subtree.
+    """
+
+    root: str
+    max_depth: int
+    depth: Dict[str, int] = field(default_factory=dict)
+    files: Dict[str, int] = field(default_factory=dict)
+    subcats: Dict[str, int] = field(default_factory=dict)
+    branch_files: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def total_files(self) -> int:
+        return sum(self.files.values())
+
+    def listing_order(self) -> List[str]:
+        """Categories that hold files, largest first so concurrent listing ends together."""
+        return sorted((c for c, n in self.files.items() if n), key=lambda c: (-self.files[c], self.depth[c], c))
+
+    def estimated_requests(self) -> int:
+        """Listing pages (500 members each) plus 50-title metadata batches."""
+        listing = sum(-(-n // 500) for n in self.files.values())
+        return listing + -(-self.total_files // BATCH_SIZE)
+
+    def summary_by_depth(self) -> List[Tuple[int, int, int]]:
+        """(depth, categories, files) per level of the tree."""
+        levels: Dict[int, List[int]] = {}
+        for category, depth in self.depth.items():
+            level = levels.setdefault(depth, [0, 0])
+            level[0] += 1
+            level[1] += self.files.get(category, 0)
+        return [(depth, n, files) for depth, (n, files) in sorted(levels.items())]
+
+
+def category_search_queries(
+    categories: Iterable[str], filters: str, sizes: Optional[Dict[str, int]] = None
+) -> List[str]:
+    """CirrusSearch queries covering ``categories``, several per ``incategory:"A|B"`` clause.
+
+    Each query stays within the search backend's 300-character limit and, when
+    ``sizes`` (files per category) are known, within its 10,000-result window.
+    """
+    queries: List[str] = []
+    chunk: List[str] = []
+    chunk_files = 0
+
+    def render(names: List[str]) -> str:
+        return f'incategory:"{"|".join(names)}" {filters}'.strip()
+
+    for category in categories:
+        name = _category_name(category).replace(" ", "_")
+        files = (sizes or {}).get(category, 0)
+        if chunk and (len(render(chunk + [name])) > SEARCH_MAX_QUERY or chunk_files + files > SEARCH_MAX_RESULTS):
+            queries.append(render(chunk))
+            chunk, chunk_files = [], 0
+        chunk.append(name)
+        chunk_files += files
+    if chunk:
+        queries.append(render(chunk))
+    return queries
+
+
+def build_session(pool_size: int = DEFAULT_MAX_WORKERS + 1) -> requests.Session:
+    """Keep-alive session with a connection pool per Commons host.
+
+    The API host and the originals host each get up to ``pool_size`` connections
+    so concurrent workers reuse warm TLS connections instead of handshaking per file.
+    """
+    session = requests.Session()
+    session.headers.update({"User-Agent": USER_AGENT})
+    for host in (COMMONS_HOST, UPLOAD_HOST):
+        session.mount(f"https://{host}/", HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size)))
+    return session
+
+
+def _safe_name(value: str) -> str:
+    return "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in value) or "anonymous"
+
+
+class TokenBucket:
+    """Thread-safe token bucket; ``acquire`` blocks until a token is available.
+
+    A non-positive rate means unlimited, but ``pause`` still blocks callers.
+    """
+
+    def __init__(self, rate_per_sec: float, capacity: float = 1.0):
+        self.rate = rate_per_sec
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self.rate <= 0:
+                    return
+                else:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """Read and write budgets for Commons requests, shared by all workers of a client.
+
+    ``min_write_interval`` additionally caps writes to one per that many seconds.
+    Server back-off signals (Retry-After, maxlag, ratelimited) pause the buckets.
+    """
+
+    def __init__(
+        self,
+        reads_per_min: float = DEFAULT_READS_PER_MIN,
+        writes_per_min: float = DEFAULT_WRITES_PER_MIN,
+        min_write_interval: float = 0.0,
+        read_burst: int = DEFAULT_MAX_WORKERS,
+    ):
+        write_rate = writes_per_min / 60.0
+        if min_write_interval > 0:
+            write_rate = min(write_rate, 1.0 / min_write_interval) if write_rate > 0 else 1.0 / min_write_interval
+        self.reads = TokenBucket(reads_per_min / 60.0, capacity=read_burst)
+        self.writes = TokenBucket(write_rate, capacity=1)
+
+    def fit_read_burst(self, workers: int):
+        """Let ``workers`` concurrent readers start at once (the burst only grows)."""
+        with self.reads._lock:
+            self.reads.capacity = max(self.reads.capacity, float(workers))
+
+    def acquire_read(self):
+        self.reads.acquire()
+
+    def acquire_write(self):
+        self.writes.acquire()
+
+    def backoff(self, seconds: float, writes_only: bool = False):
+        logging.getLogger(__name__).warning(
+            "Server asked to slow down; pausing %s for %.0fs", "writes" if writes_only else "requests", seconds
         )
+        self.writes.pause(seconds)
+        if not writes_only:
+            self.reads.pause(seconds)
+
+
+def _retry_after_seconds(value: Optional[str]) -> float:
+    try:
+        return max(float(value), 1.0) if value else DEFAULT_BACKOFF
+    except ValueError:
+        # Retry-After may also be an HTTP date; fall back to the default pause.
+        return DEFAULT_BACKOFF
+
+
+# Failure classes: (max attempts, safe to repeat for non-idempotent requests such as uploads).
+RETRY_POLICY: Dict[str, Tuple[int, bool]] = {
+    "network": (5, False),  # timeout / dropped connection: the request may have been applied
+    "server": (5, False),  # 5xx or mwclient giving up on its own retries
+    "throttled": (8, True),  # 429, maxlag, ratelimited, readonly: refused before doing anything
+}
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 120.0
+THROTTLED_API_CODES = {"ratelimited", "maxlag", "readonly"}
+
+
+def _failure_class(exc: BaseException) -> Optional[str]:
+    """Map an exception to a RETRY_POLICY class, or None when retrying cannot help."""
+    if isinstance(exc, mwclient.errors.APIError):
+        if exc.code in THROTTLED_API_CODES:
+            return "throttled"
+        if str(exc.code).startswith("internal_api_error_DB"):
+            return "server"
+        return None
+    if isinstance(exc, mwclient.errors.MaximumRetriesExceeded):
+        return "server"
+    if isinstance(exc, requests.exceptions.HTTPError):
+        status = exc.response.status_code if exc.response is not None else 0
+        if status == 429:
+            return "throttled"
+        return "server" if 500 <= status < 600 else None
+    if isinstance(
+        exc,
+        (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+        ),
+    ):
+        return "network"
+    return None
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponential backoff with +/-50% jitter so parallel workers do not retry in lockstep."""
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** (attempt - 1)))
+    return delay * random.uniform(0.5, 1.5)
 
 
 class CommonsClient:
-    def __init__(self, login: str, password: str, download_dir: Optional[str] = None):
+    def __init__(
+        self,
+        login: str,
+        password: str,
+        download_dir: Optional[str] = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        cache_path: Optional[str] = None,
+        cache_max_entries: int = DEFAULT_MAX_ENTRIES,
+        rate_limiter: Optional[RateLimiter] = None,
+        pool_size: Optional[int] = None,
+        session_file: Optional[str] = DEFAULT_SESSION_FILE,
+    ):
         self._login = login
         self._password = password
+        self._stats: Counter = Counter()
+        self._stats_lock = threading.Lock()
+        self.limiter = rate_limiter or RateLimiter(read_burst=max(1, max_workers))
+        self.limiter.fit_read_burst(max(1, max_workers))
+        # One keep-alive transport for API calls and original downloads; the extra
+        # connection covers the thread that drives listing while workers fetch.
+        self._session = build_session(pool_size or max(1, max_workers) + 1)
+        # mwclient waits out lag on its own; the hook lets every worker see the signal.
+        self._session.hooks["response"].append(self._observe_response)
         self._site = mwclient.Site(
-            host="commons.wikimedia.org",
+            host=COMMONS_HOST,
             path="/w/",
             scheme="https",
-            clients_useragent="AddGeoLocationBot/1.0 (https://github.com/wilfredor/addwikigeolocation; wilfredor@gmail.com)",
-        )
-        self._site.login(self._login, self._password)
-        self._csrf_token = self._site.get_token("csrf")
-        self._session = requests.Session()
-        self._session.headers.update(
-            {
-                "User-Agent": "AddGeoLocationBot/1.0 (https://github.com/wilfredor/addwikigeolocation; wilfredor@gmail.com)"
-            }
+            pool=self._session,
+            clients_useragent=USER_AGENT,
+            max_lag=DEFAULT_MAXLAG,
+            # Keep mwclient's own retry loop short; _with_retries owns backoff and counting.
+            max_retries=2,
         )
+        # Login is deferred to the first write; read-only runs never authenticate.
+        self._csrf_token: Optional[str] = None
+        self._login_lock = threading.Lock()
+        self._session_file = Path(session_file.format(user=_safe_name(login))).expanduser() if session_file else None
         self._download_dir_ctx = None
         if download_dir:
             self._download_dir = Path(download_dir)
@@ -123,16 +558,202 @@ class CommonsClient:
         self.download_dir = self._download_dir
         self._logger = logging.getLogger(__name__)
         self._user_rights: Optional[set] = None
+        # Ceiling for metadata batches kept in flight at once.
+        self._max_workers = max(1, max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Optional on-disk cache of page results, revalidated against lastrevid.
+        self._cache = ApiCache(Path(cache_path), max_entries=cache_max_entries) if cache_path else None
 
     def close(self):
+        self._shutdown_executor()
+        self._close_cache()
         if self._download_dir_ctx:
             self._download_dir_ctx.cleanup()
 
+    def _close_cache(self):
+        if self._cache is not None:
+            self._logger.info("API cache: %d hits, %d misses", self._cache.hits, self._cache.misses)
+            self._cache.close()
+            self._cache = None
+
+    def _observe_response(self, response: requests.Response, *args, **kwargs):
+        if response.status_code in (429, 503) or response.headers.get("X-Database-Lag"):
+            self.limiter.backoff(_retry_after_seconds(response.headers.get("Retry-After")))
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def stats_summary(self) -> str:
+        stats = self.stats
+        summary = (
+            f"Requests: {stats.get('requests', 0)}, retried: {stats.get('retries', 0)}, "
+            f"failed after retries: {stats.get('failures', 0)}"
+        )
+        if stats.get("probes"):
+            summary += f", EXIF probes: {stats['probes']}"
+        if stats.get("uploads_skipped"):
+            summary += f", identical uploads skipped: {stats['uploads_skipped']}"
+        return summary
+
+    def _with_retries(self, what: str, call: Callable[[], T], idempotent: bool = True) -> T:
+        """Run ``call`` with jittered exponential backoff according to RETRY_POLICY.
+
+        Non-idempotent calls are only repeated for failures where the server refused
+        the request outright.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            self._count("requests")
+            try:
+                return call()
+            except Exception as exc:
+                kind = _failure_class(exc)
+                if kind is None:
+                    raise
+                max_attempts, safe_to_repeat = RETRY_POLICY[kind]
+                if attempt >= max_attempts or not (idempotent or safe_to_repeat):
+                    self._count("failures")
+                    self._count(f"failures_{kind}")
+                    raise
+                delay = _backoff_delay(attempt)
+                self._count("retries")
+                self._count(f"retries_{kind}")
+                self._logger.warning(
+                    "%s failed (%s: %s); retry %d/%d in %.1fs", what, kind, exc, attempt, max_attempts - 1, delay
+                )
+                time.sleep(delay)
+
+    def _api(self, action: str, write: bool = False, **params) -> dict:
+        """Call the action API under the shared read or write budget, retrying transient failures."""
+
+        def call() -> dict:
+            if write:
+                self.limiter.acquire_write()
+                self._ensure_login()
+            else:
+                self.limiter.acquire_read()
+            for attempt in range(2):
+                if write:
+                    params["token"] = self._csrf_token
+                try:
+                    return self._site.api(action, **params)
+                except mwclient.errors.APIError as exc:
+                    if write and attempt == 0 and exc.code in SESSION_ERROR_CODES:
+                        self._refresh_login()
+                        continue
+                    self._note_api_error(exc)
+                    raise
+            raise AssertionError("unreachable")
+
+        # Queries are read-only and resending identical wikitext is a null edit, so both may repeat.
+        return self._with_retries(f"API {action}", call)
+
+    def _note_api_error(self, exc: mwclient.errors.APIError):
+        if exc.code == "ratelimited":
+            self.limiter.backoff(60.0, writes_only=True)
+        elif exc.code == "maxlag":
+            self.limiter.backoff(DEFAULT_BACKOFF)
+
+    def _ensure_login(self):
+        """Authenticate once, preferring the cookies and CSRF token saved by an earlier run."""
+        with self._login_lock:
+            if self._csrf_token:
+                return
+            if self._restore_session():
+                return
+            self._fresh_login()
+
+    def _restore_session(self) -> bool:
+        if not self._session_file or not self._session_file.exists():
+            return False
+        try:
+            saved = json.loads(self._session_file.read_text())
+        except (OSError, ValueError):
+            return False
+        if saved.get("user") != self._login or not saved.get("csrf"):
+            return False
+        for cookie in saved.get("cookies", []):
+            self._session.cookies.set(
+                cookie["name"],
+                cookie["value"],
+                domain=cookie.get("domain"),
+                path=cookie.get("path", "/"),
+                expires=cookie.get("expires"),
+                secure=cookie.get("secure", False),
+            )
+        # One userinfo round trip tells mwclient whether the cookies are still valid.
+        self._site.site_init()
+        if not self._site.logged_in:
+            self._session.cookies.clear()
+            return False
+        self._csrf_token = saved["csrf"]
+        self._site.tokens["csrf"] = self._csrf_token
+        self._logger.info("Reusing saved Commons session for %s", self._login)
+        return True
+
+    def _fresh_login(self):
+        self._site.login(self._login, self._password)
+        self._csrf_token = self._site.get_token("csrf", force=True)
+        self._save_session()
+
+    def _refresh_login(self):
+        """Drop the current session after badtoken/assertion failures and log in again."""
+        with self._login_lock:
+            self._logger.info("Session or CSRF token rejected; logging in again")
+            self._session.cookies.clear()
+            self._site.tokens.clear()
+            self._csrf_token = None
+            self._fresh_login()
+
+    def _save_session(self):
+        if not self._session_file:
+            return
+        data = {
+            "user": self._login,
+            "csrf": self._csrf_token,
+            "cookies": [
+                {
+                    "name": c.name,
+                    "value": c.value,
+                    "domain": c.domain,
+                    "path": c.path,
+                    "expires": c.expires,
+                    "secure": c.secure,
+                }
+                for c in self._session.cookies
+            ],
+        }
+        try:
+            self._session_file.parent.mkdir(parents=True, exist_ok=True)
+            # Session cookies are credentials: keep the file private to the user.
+            fd = os.open(self._session_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as fh:
+                json.dump(data, fh)
+        except OSError as exc:
+            self._logger.warning("Could not save session to %s: %s", self._session_file, exc)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="commons-fetch")
+        return self._executor
+
+    def _shutdown_executor(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
     def _strip_file_prefix(self, title: str) -> str:
         return title.replace("File:", "", 1) if title.startswith("File:") else title
 
     def _get_url_for_revision(self, title: str, oldid: int) -> Optional[str]:
-        data = self._site.api(
+        data = self._api(
             "query",
             prop="imageinfo",
             iiprop="url",
@@ -151,7 +772,7 @@ class CommonsClient:
         return imageinfo[0].get("url")
 
     def get_previous_revision_url(self, title: str) -> Optional[str]:
-        data = self._site.api(
+        data = self._api(
             "query",
             prop="imageinfo",
             titles=f"File:{title}",
@@ -188,82 +809,350 @@ class CommonsClient:
         except (TypeError, ValueError):
             return None
 
-    def _fetch_pages_batch(self, titles: Iterable[str]) -> List[UploadInfo]:
-        pages = self._site.api(
+    @staticmethod
+    def _field_params(fields: FrozenSet[str]) -> Dict[str, str]:
+        """Build the prop/iiprop query parameters needed to fill the requested fields."""
+        props = []
+        iiprop = []
+        if FIELD_COORDS in fields:
+            props.append("coordinates")
+        if FIELD_EXIF_GPS in fields:
+            iiprop.append("metadata")
+        if FIELD_URL in fields:
+            iiprop.append("url")
+        ext_filter = []
+        if FIELD_AUTHOR in fields:
+            ext_filter.extend(["Artist", "Author"])
+        if FIELD_DESCRIPTION in fields:
+            ext_filter.append("Description")
+        if ext_filter:
+            iiprop.append("extmetadata")
+        params: Dict[str, str] = {}
+        if iiprop:
+            props.insert(0, "imageinfo")
+            params["iiprop"] = "|".join(iiprop)
+        if ext_filter:
+            params["iiextmetadatafilter"] = "|".join(ext_filter)
+        if props:
+            params["prop"] = "|".join(props)
+        return params
+
+    def _page_to_upload(self, page: dict, fields: FrozenSet[str]) -> UploadInfo:
+        title = self._strip_file_prefix(page.get("title", ""))
+        coords = page.get("coordinates")
+        lat = coords[0].get("lat") if coords else None
+        lon = coords[0].get("lon") if coords else None
+        imageinfo = page.get("imageinfo", [])
+        info = imageinfo[0] if imageinfo else {}
+        exif_lat = exif_lon = None
+        exif_gps_uncertain = False
+        if FIELD_EXIF_GPS in fields:
+            metadata_block = info.get("metadata") or []
+            exif_lat = self._get_lat_lon_gps("GPSLatitude", metadata_block)
+            exif_lon = self._get_lat_lon_gps("GPSLongitude", metadata_block)
+            if info and (exif_lat is None or exif_lon is None):
+                exif_gps_uncertain = not metadata_block or any(
+                    isinstance(item, dict) and str(item.get("name", "")).startswith("GPS") for item in metadata_block
+                )
+        extmeta = info.get("extmetadata") or {}
+        author = None
+        if FIELD_AUTHOR in fields:
+            author = _intern(extmeta.get("Artist", {}).get("value") or extmeta.get("Author", {}).get("value"))
+        description = None
+        if FIELD_DESCRIPTION in fields:
+            description = extmeta.get("Description", {}).get("value")
+        return UploadInfo(
+            title=title,
+            has_coords=coords is not None,
+            has_exif_gps=exif_lat is not None and exif_lon is not None,
+            lat=lat,
+            lon=lon,
+            url=info.get("url"),
+            author=author,
+            description=description,
+            exif_lat=exif_lat,
+            exif_lon=exif_lon,
+            exif_gps_uncertain=exif_gps_uncertain,
+        )
+
+    def _fetch_lastrevids(self, titles: List[str]) -> Dict[str, int]:
+        """Current revision id per title (without ``File:``), one cheap prop=info call per 50 titles."""
+        revids: Dict[str, int] = {}
+        for i in range(0, len(titles), BATCH_SIZE):
+            batch = titles[i : i + BATCH_SIZE]
+            full_titles = {t if t.startswith("File:") else f"File:{t}": self._strip_file_prefix(t) for t in batch}
+            data = self._api("query", prop="info", titles="|".join(full_titles), format="json")
+            if not data or "query" not in data:
+                continue
+            normalized = {n.get("to"): n.get("from") for n in data["query"].get("normalized", [])}
+            for page in data["query"].get("pages", {}).values():
+                if not page.get("lastrevid"):
+                    continue
+                asked = normalized.get(page.get("title"), page.get("title"))
+                revids[full_titles.get(asked, self._strip_file_prefix(asked or ""))] = page["lastrevid"]
+        return revids
+
+    def _fetch_pages_batch(self, titles: Iterable[str], fields: Optional[Iterable[str]] = None) -> List[UploadInfo]:
+        titles = list(titles)
+        wanted = ALL_FIELDS if fields is None else frozenset(fields)
+        if not wanted:
+            # Nothing to fetch: the listed titles are the whole record.
+            return [
+                UploadInfo(title=self._strip_file_prefix(t).replace("_", " "), has_coords=False, has_exif_gps=False)
+                for t in titles
+            ]
+        if self._cache is None:
+            return self._query_pages_batch(titles, wanted)
+        kind = "pages:" + ",".join(sorted(wanted))
+        # Records carry the API's title (spaces, not underscores); key the cache the same way.
+        revids = {title.replace("_", " "): revid for title, revid in self._fetch_lastrevids(titles).items()}
+        cached = self._cache.get_many(kind, revids)
+        missing = [t for t in titles if self._strip_file_prefix(t).replace("_", " ") not in cached]
+        fetched = self._query_pages_batch(missing, wanted) if missing else []
+        self._cache.put_many(kind, [(u.title, revids[u.title], u.to_dict()) for u in fetched if u.title in revids])
+        results = [UploadInfo.from_dict(data) for data in cached.values()] + fetched
+        order = {self._strip_file_prefix(t).replace("_", " "): i for i, t in enumerate(titles)}
+        results.sort(key=lambda u: order.get(u.title, len(order)))
+        return results
+
+    def _query_pages_batch(self, titles: List[str], wanted: FrozenSet[str]) -> List[UploadInfo]:
+        pages = self._api(
             "query",
-            prop="imageinfo|coordinates",
-            iiprop="metadata|url|extmetadata",
             titles="|".join(titles),
             format="json",
+            **self._field_params(wanted),
         )
         results = []
         if not pages or "query" not in pages or "pages" not in pages["query"]:
             return results
         for page in pages["query"]["pages"].values():
-            title = self._strip_file_prefix(page.get("title", ""))
-            coords = page.get("coordinates")
-            lat = coords[0].get("lat") if coords else None
-            lon = coords[0].get("lon") if coords else None
-            imageinfo = page.get("imageinfo", [])
-            metadata_block = imageinfo[0].get("metadata", []) if imageinfo else []
-            url = imageinfo[0].get("url") if imageinfo else None
-            extmeta = imageinfo[0].get("extmetadata", {}) if imageinfo else {}
-            author = extmeta.get("Artist", {}).get("value") or extmeta.get("Author", {}).get("value")
-            description = extmeta.get("Description", {}).get("value") if extmeta else None
-            has_coords = coords is not None
-            has_exif_gps = self._has_metadata_gps(metadata_block)
-            results.append(
-                UploadInfo(
-                    title=title,
-                    has_coords=has_coords,
-                    has_exif_gps=has_exif_gps,
-                    lat=lat,
-                    lon=lon,
-                    url=url,
-                    author=author,
-                    description=description,
-                )
-            )
+            results.append(self._page_to_upload(page, wanted))
+        # The API keys pages by pageid; hand them back in the order they were asked for.
+        order = {self._strip_file_prefix(t).replace("_", " "): i for i, t in enumerate(titles)}
+        results.sort(key=lambda u: order.get(u.title, len(order)))
         return results
 
-    def fetch_uploads_for_titles(self, titles: List[str]) -> List[UploadInfo]:
-        uploads: List[UploadInfo] = []
-        for i in range(0, len(titles), 50):
-            batch = titles[i : i + 50]
-            uploads.extend(self._fetch_pages_batch(batch))
-        return uploads
+    def _submit_batches(
+        self,
+        titles: Iterable[str],
+        seen: Optional[TitleSet] = None,
+        fields: Optional[Iterable[str]] = None,
+    ) -> List[Future]:
+        """Queue 50-title metadata batches on the worker pool, skipping titles already seen."""
+        pending: List[str] = []
+        for title in titles:
+            if seen is not None:
+                if title in seen:
+                    continue
+                seen.add(title)
+            pending.append(title)
+        executor = self._get_executor()
+        return [
+            executor.submit(self._fetch_pages_batch, pending[i : i + BATCH_SIZE], fields)
+            for i in range(0, len(pending), BATCH_SIZE)
+        ]
+
+    @staticmethod
+    def _iter_batches(futures: Iterable[Future], emitted: TitleSet) -> Iterator[UploadInfo]:
+        """Yield submitted batches in submission order as they complete, dropping duplicate titles."""
+        for future in futures:
+            for upload in future.result():
+                if upload.title in emitted:
+                    continue
+                emitted.add(upload.title)
+                yield upload
+
+    def fetch_uploads_for_titles(
+        self, titles: List[str], fields: Optional[Iterable[str]] = None
+    ) -> List[UploadInfo]:
+        futures = self._submit_batches(titles, seen=TitleSet(), fields=fields)
+        return list(self._iter_batches(futures, TitleSet()))
+
+    def _iter_generator(
+        self,
+        params: Dict[str, str],
+        fields: FrozenSet[str],
+        cont_token: Optional[dict] = None,
+    ) -> Iterator[Tuple[List[dict], Optional[dict]]]:
+        """Page through a generator query with the field props attached.
+
+        Prop continuation (iicontinue, cocontinue) can split one generator batch over
+        several responses, so pages are merged until the API reports ``batchcomplete``
+        and then yielded together with the continuation for the next batch.
+        """
+        base = dict(params, **self._field_params(fields))
+        if FIELD_COORDS in fields:
+            base["colimit"] = "max"
+        request = dict(base, **cont_token) if cont_token else dict(base)
+        pending: Dict[str, dict] = {}
+        while True:
+            data = self._api(**request)
+            if not data or "query" not in data:
+                if pending:
+                    yield list(pending.values()), None
+                return
+            for key, page in data["query"].get("pages", {}).items():
+                merged = pending.setdefault(key, {})
+                for name, value in page.items():
+                    if isinstance(value, list) and isinstance(merged.get(name), list):
+                        merged[name].extend(value)
+                    else:
+                        merged[name] = value
+            cont = data.get("continue")
+            if "batchcomplete" in data or not cont:
+                yield list(pending.values()), cont
+                pending = {}
+            if not cont:
+                return
+            # Each request carries the base parameters plus only the latest continuation.
+            request = dict(base, **cont)
+
+    def _generator_uploads(self, pages: Iterable[dict], fields: FrozenSet[str], seen: TitleSet) -> List[UploadInfo]:
+        results: List[UploadInfo] = []
+        for page in pages:
+            if page.get("ns") != 6:
+                continue
+            upload = self._page_to_upload(page, fields)
+            if upload.title in seen:
+                continue
+            seen.add(upload.title)
+            results.append(upload)
+        return results
 
     def fetch_wikitext(self, title: str) -> Optional[str]:
-        full_title = title if title.startswith("File:") else f"File:{title}"
-        try:
-            data = self._site.api(
-                "query",
-                prop="revisions",
-                titles=full_title,
-                rvprop="content",
-                rvslots="main",
-                format="json",
-            )
-        except Exception as exc:
-            self._logger.warning("Failed to fetch wikitext for %s: %s", full_title, exc)
-            return ""
-        if not data or "query" not in data or "pages" not in data["query"]:
-            return ""
-        page = next(iter(data["query"]["pages"].values()))
-        revisions = page.get("revisions", [])
-        if not revisions:
-            return ""
-        slots = revisions[0].get("slots", {})
-        main = slots.get("main", {})
-        return main.get("*") or main.get("content") or ""
+        rev = self.fetch_wikitext_many([title])[self._strip_file_prefix(title)]
+        return rev[0] if rev is not None else None
+
+    def _fetch_wikitext_batch(self, titles: List[str]) -> Dict[str, Optional[WikitextRevision]]:
+        if self._cache is None:
+            return self._query_wikitext_batch(titles)
+        revids = self._fetch_lastrevids(titles)
+        cached = {title: tuple(value) for title, value in self._cache.get_many("wikitext", revids).items()}
+        missing = [t for t in titles if self._strip_file_prefix(t) not in cached]
+        fetched = self._query_wikitext_batch(missing) if missing else {}
+        self._cache.put_many("wikitext", [(title, rev[1], list(rev)) for title, rev in fetched.items() if rev and rev[1]])
+        return {**cached, **fetched}
+
+    def _query_wikitext_batch(self, titles: List[str]) -> Dict[str, Optional[WikitextRevision]]:
+        full_titles = {t if t.startswith("File:") else f"File:{t}": self._strip_file_prefix(t) for t in titles}
+        params = {
+            "action": "query",
+            "prop": "revisions",
+            "titles": "|".join(full_titles),
+            "rvprop": "content|ids|timestamp",
+            "rvslots": "main",
+            "format": "json",
+        }
+        results: Dict[str, Optional[WikitextRevision]] = {}
+        request = dict(params)
+        while True:
+            try:
+                data = self._api(**request)
+            except Exception as exc:
+                self._logger.warning("Failed to fetch wikitext for %d titles: %s", len(titles), exc)
+                break
+            if not data or "query" not in data:
+                break
+            # Map API-normalised titles (spaces, capitalisation) back to what the caller asked for.
+            normalized = {n.get("to"): n.get("from") for n in data["query"].get("normalized", [])}
+            for page in data["query"].get("pages", {}).values():
+                revisions = page.get("revisions", [])
+                if not revisions:
+                    continue
+                asked = normalized.get(page.get("title"), page.get("title"))
+                key = full_titles.get(asked, self._strip_file_prefix(asked or ""))
+                main = revisions[0].get("slots", {}).get("main", {})
+                text = main.get("*") or main.get("content") or ""
+                results[key] = (text, revisions[0].get("revid"), revisions[0].get("timestamp"))
+            if "continue" not in data:
+                break
+            request = dict(params, **data["continue"])
+        # Failed requests and pages without a revision must not look like empty pages.
+        for key in full_titles.values():
+            results.setdefault(key, None)
+        return results
+
+    def fetch_wikitext_many(self, titles: Iterable[str]) -> Dict[str, Optional[WikitextRevision]]:
+        """Fetch the current wikitext of many pages, 50 titles per request.
+
+        Returns title (without ``File:``) -> (text, revid, timestamp). Missing pages and
+        failed batches map to None; callers must skip them rather than edit.
+        """
+        unique = list(dict.fromkeys(titles))
+        executor = self._get_executor()
+        futures = [
+            executor.submit(self._fetch_wikitext_batch, unique[i : i + BATCH_SIZE])
+            for i in range(0, len(unique), BATCH_SIZE)
+        ]
+        results: Dict[str, Optional[WikitextRevision]] = {}
+        for future in futures:
+            results.update(future.result())
+        return results
+
+    def iter_with_wikitext(
+        self, uploads: Iterable[UploadInfo], window: int = BATCH_SIZE
+    ) -> Iterator[Tuple[UploadInfo, Optional[WikitextRevision]]]:
+        """Pair each upload with its current (text, revid, timestamp), or None if it could not be read.
+
+        Wikitext is fetched one window per request, and the next window is
+        requested while the current one is being processed.
+        """
+        window = max(1, min(window, BATCH_SIZE))
+        source = iter(uploads)
+
+        def next_window() -> Tuple[List[UploadInfo], Optional[Future]]:
+            chunk = list(islice(source, window))
+            if not chunk:
+                return chunk, None
+            return chunk, self._get_executor().submit(self._fetch_wikitext_batch, [u.title for u in chunk])
+
+        current, pending = next_window()
+        while pending is not None:
+            upcoming, upcoming_pending = next_window()
+            texts = pending.result()
+            for upload in current:
+                yield upload, texts.get(self._strip_file_prefix(upload.title))
+            current, pending = upcoming, upcoming_pending
 
     def list_uploads(
         self,
         username: str,
         cont_token: Optional[dict] = None,
-        seen_titles: Optional[set] = None,
+        seen_titles: Optional[Iterable[str]] = None,
         since: Optional[str] = None,
+        fields: Optional[Iterable[str]] = None,
+        generator: bool = False,
     ) -> Tuple[List[UploadInfo], Optional[dict]]:
+        """List files uploaded by ``username`` with their metadata (see iter_uploads)."""
+        results: List[UploadInfo] = []
+        for upload, _ in self.iter_uploads(
+            username, cont_token=cont_token, seen_titles=seen_titles, since=since, fields=fields, generator=generator
+        ):
+            results.append(upload)
+            if len(results) % 500 == 0:
+                print(f" Scanned {len(results)} uploads so far...")
+        return results, None
+
+    def iter_uploads(
+        self,
+        username: str,
+        cont_token: Optional[dict] = None,
+        seen_titles: Optional[Iterable[str]] = None,
+        since: Optional[str] = None,
+        fields: Optional[Iterable[str]] = None,
+        generator: bool = False,
+    ) -> Iterator[Tuple[UploadInfo, Optional[dict]]]:
+        """Yield ``(upload, cont)`` for files uploaded by ``username`` as batches arrive.
+
+        ``cont`` is the continuation that lists the page the upload came from; passing it
+        back as ``cont_token`` resumes the scan there (already seen titles are skipped).
+        By default the upload log is paged and metadata fetched in separate batches.
+        With ``generator=True`` a single ``generator=allimages`` stream returns both;
+        it only covers files whose current version was uploaded by the user.
+        """
+        if generator:
+            yield from self._iter_uploads_generator(username, cont_token, seen_titles, since, fields)
+            return
         base_params = {
             "action": "query",
             "list": "logevents",
@@ -278,83 +1167,331 @@ class CommonsClient:
             base_params["leend"] = since
         if cont_token:
             base_params.update(cont_token)
-        results: List[UploadInfo] = []
-        seen = set(seen_titles) if seen_titles else set()
-        total = 0
+        seen = TitleSet(seen_titles)
+        emitted = TitleSet()
+        in_flight: List[Future] = []
+        in_flight_token = cont_token
         while True:
-            data = self._site.api(**base_params)
-            if not data or "query" not in data or "logevents" not in data["query"]:
-                return results, None
-            titles = [ev.get("title") for ev in data["query"]["logevents"] if ev.get("title")]
-            new_titles = [t for t in titles if t not in seen]
-            seen.update(new_titles)
-            for i in range(0, len(new_titles), 50):
-                batch = new_titles[i : i + 50]
-                batch_results = self._fetch_pages_batch(batch)
-                results.extend(batch_results)
-                total += len(batch_results)
-                if total and total % 500 == 0:
-                    print(f" Scanned {total} uploads so far...")
-            if "continue" not in data:
-                return results, None
+            # Metadata batches for the previous log page run while the next page is listed.
+            data = self._api(**base_params)
+            listed = bool(data and "query" in data and "logevents" in data["query"])
+            titles = [ev.get("title") for ev in data["query"]["logevents"] if ev.get("title")] if listed else []
+            for upload in self._iter_batches(in_flight, emitted):
+                yield upload, in_flight_token
+            in_flight = self._submit_batches(titles, seen=seen, fields=fields)
+            in_flight_token = cont_token
+            if not listed or "continue" not in data:
+                for upload in self._iter_batches(in_flight, emitted):
+                    yield upload, in_flight_token
+                return
             base_params.update(data["continue"])
             cont_token = data["continue"]
-            time.sleep(randrange(1))
 
-    def download_file(self, upload: UploadInfo) -> Optional[Path]:
+    def latest_upload_timestamp(self, username: str, generator: bool = False) -> Optional[str]:
+        """Timestamp of ``username``'s newest upload as iter_uploads would list it, or None.
+
+        Matches the listing mode: the upload log by default, the current file
+        versions (allimages) with ``generator=True``.
+        """
+        if generator:
+            data = self._api(
+                "query", list="allimages", aiuser=username, aisort="timestamp", aidir="older", aiprop="timestamp", ailimit=1
+            )
+            entries = data.get("query", {}).get("allimages", [])
+        else:
+            data = self._api("query", list="logevents", letype="upload", leuser=username, leprop="timestamp", lelimit=1)
+            entries = data.get("query", {}).get("logevents", [])
+        return entries[0].get("timestamp") if entries else None
+
+    def _iter_uploads_generator(
+        self,
+        username: str,
+        cont_token: Optional[dict],
+        seen_titles: Optional[Iterable[str]],
+        since: Optional[str],
+        fields: Optional[Iterable[str]],
+    ) -> Iterator[Tuple[UploadInfo, Optional[dict]]]:
+        wanted = ALL_FIELDS if fields is None else frozenset(fields)
+        params = {
+            "action": "query",
+            "generator": "allimages",
+            "gaiuser": username,
+            "gaisort": "timestamp",
+            "gaidir": "older",
+            "gailimit": "max",
+        }
+        if since:
+            params["gaiend"] = since
+        seen = TitleSet(seen_titles)
+        for pages, next_token in self._iter_generator(params, wanted, cont_token):
+            for upload in self._generator_uploads(pages, wanted, seen):
+                yield upload, cont_token
+            cont_token = next_token
+
+    def _resolve_url(self, upload: UploadInfo, derive: bool = False) -> Optional[str]:
+        """Stored URL, else the ``oldid`` revision's; with ``derive``, else the current original's.
+
+        Only the scan/processing path derives it (scans drop the URL to save
+        memory). Restores must not fall back to the current file.
+        """
         if not upload.url:
             if upload.oldid:
                 upload.url = self._get_url_for_revision(upload.title, upload.oldid)
-            if not upload.url:
-                return None
-        local_path = self._download_dir / upload.title.replace("/", "_")
-        if local_path.exists():
-            local_path.unlink()
-        try:
+            elif derive:
+                upload.url = original_file_url(upload.title)
+        return upload.url
+
+    def _fetch_original(
+        self,
+        upload: UploadInfo,
+        open_sink: Callable[[], BinaryIO],
+        edit: Optional[jpeg_exif.ExifEdit] = None,
+    ) -> Optional[Tuple[BinaryIO, bool]]:
+        """Stream the original into a fresh sink from ``open_sink``; None for non-JPEG responses.
+
+        With ``edit``, the EXIF segment is rewritten as the response arrives and
+        the rest of the body is copied straight through, so no unpatched copy is
+        ever stored. Returns the sink and whether ``edit`` changed the EXIF.
+        """
+
+        def fetch() -> Optional[Tuple[BinaryIO, bool]]:
+            self.limiter.acquire_read()
             with self._session.get(upload.url, stream=True, timeout=10) as r:
                 r.raise_for_status()
                 ctype = r.headers.get("Content-Type", "")
                 if "jpeg" not in ctype.lower():
                     self._logger.warning("Skipping %s due to non-JPEG content-type: %s", upload.title, ctype)
                     return None
-                with open(local_path, "wb") as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        f.write(chunk)
-            return local_path
+                sink = open_sink()
+                changed = False
+                try:
+                    chunks = r.iter_content(chunk_size=DOWNLOAD_CHUNK)
+                    if edit is None:
+                        for chunk in chunks:
+                            sink.write(chunk)
+                    else:
+                        changed = jpeg_exif.rewrite_exif(jpeg_exif.stream_reader(chunks), sink, edit)
+                except BaseException:
+                    sink.close()
+                    raise
+            return sink, changed
+
+        try:
+            return self._with_retries(f"Download {upload.title}", fetch)
         except requests.exceptions.RequestException as e:
             self._logger.error("Error downloading %s: %s", upload.title, e)
             return None
 
+    def download_file(self, upload: UploadInfo) -> Optional[Path]:
+        if not self._resolve_url(upload):
+            return None
+        local_path = self._download_dir / upload.title.replace("/", "_")
+        if local_path.exists():
+            local_path.unlink()
+        fetched = self._fetch_original(upload, lambda: open(local_path, "wb"))
+        if fetched is None:
+            return None
+        fetched[0].close()
+        return local_path
+
+    def download_original(self, upload: UploadInfo) -> Optional[BinaryIO]:
+        """Download the original into memory, spilling to ``download_dir`` above SPOOL_MAX_BYTES.
+
+        The returned buffer is rewound; close it (or pass it to ``cleanup_file``) when done.
+        """
+        fetched = self.download_edited(upload, None)
+        return fetched[0] if fetched is not None else None
+
+    def download_edited(self, upload: UploadInfo, edit: Optional[jpeg_exif.ExifEdit]) -> Optional[Tuple[BinaryIO, bool]]:
+        """Download the original with ``edit`` applied to its EXIF on the fly.
+
+        Returns a rewound buffer, as ``download_original`` does, and whether the
+        EXIF changed. Memory use is bounded by SPOOL_MAX_BYTES whatever the image size.
+        """
+        if not self._resolve_url(upload, derive=True):
+            return None
+        fetched = self._fetch_original(upload, self._spooled_buffer, edit)
+        if fetched is not None:
+            fetched[0].seek(0)
+        return fetched
+
+    def download_with_gps(self, upload: UploadInfo) -> Optional[BinaryIO]:
+        """Download the original with the page coordinates written into its EXIF while streaming."""
+        if not valid_coordinates(upload.lat, upload.lon):
+            raise ValueError(f"Invalid coordinates for {upload.title}: {upload.lat}, {upload.lon}")
+        fetched = self.download_edited(upload, jpeg_exif.set_gps_edit(upload.lat, upload.lon))
+        return fetched[0] if fetched is not None else None
+
+    def probe_exif_gps(self, upload: UploadInfo) -> Optional[bool]:
+        """Read only the head of the original (a Range request) and report whether its EXIF has GPS.
+
+        Returns None when the answer needs the full file: the EXIF segment does
+        not end within PROBE_BYTES, the body is not a JPEG, or the request failed.
+        """
+        if not self._resolve_url(upload, derive=True):
+            return None
+
+        def fetch() -> Optional[bytes]:
+            self.limiter.acquire_read()
+            headers = {"Range": f"bytes=0-{PROBE_BYTES - 1}"}
+            with self._session.get(upload.url, stream=True, timeout=10, headers=headers) as r:
+                r.raise_for_status()
+                if "jpeg" not in r.headers.get("Content-Type", "").lower():
+                    return None
+                head = bytearray()
+                # A server that ignores Range answers 200 with the whole file; stop reading early.
+                for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK):
+                    head += chunk
+                    if len(head) >= PROBE_BYTES:
+                        break
+            return bytes(head[:PROBE_BYTES])
+
+        try:
+            head = self._with_retries(f"Probe {upload.title}", fetch)
+        except requests.exceptions.RequestException as e:
+            self._logger.warning("Could not probe %s: %s", upload.title, e)
+            return None
+        if head is None:
+            return None
+        self._count("probes")
+        try:
+            segment, start, end = jpeg_exif.read_head(io.BytesIO(head))
+            return jpeg_exif.has_gps(segment[start + 4 : end] if end > start else None)
+        except jpeg_exif.JpegError:
+            return None
+
+    def _spooled_buffer(self) -> BinaryIO:
+        return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, dir=self._download_dir)
+
     def write_exif(self, upload: UploadInfo, local_path: Path):
         if not valid_coordinates(upload.lat, upload.lon):
             raise ValueError(f"Invalid coordinates for {upload.title}: {upload.lat}, {upload.lon}")
         set_gps_location(local_path, upload.lat, upload.lon)
 
-    def upload_file(self, upload: UploadInfo, local_path: Path, comment: str = "Adding geolocation"):
-        with open(local_path, "rb") as fh:
-            self._site.upload(
-                fh,
-                filename=upload.title,
-                description=None,
-                comment=comment,
-                ignore=True,
-            )
+    def write_exif_buffer(self, upload: UploadInfo, original: BinaryIO) -> BinaryIO:
+        """Return a new rewound buffer holding ``original`` with the page coordinates in its EXIF.
+
+        Only the JPEG head is parsed; the image data is copied once. ``original``
+        is left for the caller to close.
+        """
+        if not valid_coordinates(upload.lat, upload.lon):
+            raise ValueError(f"Invalid coordinates for {upload.title}: {upload.lat}, {upload.lon}")
+        patched = self._spooled_buffer()
+        try:
+            original.seek(0)
+            jpeg_exif.rewrite_exif(original, patched, jpeg_exif.set_gps_edit(upload.lat, upload.lon))
+        except BaseException:
+            patched.close()
+            raise
+        patched.seek(0)
+        return patched
+
+    def current_sha1(self, title: str) -> Optional[str]:
+        """SHA-1 (hex) of the file's current version, or None if it has none."""
+        full_title = title if title.startswith("File:") else f"File:{title}"
+        data = self._api("query", prop="imageinfo", iiprop="sha1", titles=full_title, format="json")
+        if not data or "query" not in data or "pages" not in data["query"]:
+            return None
+        page = next(iter(data["query"]["pages"].values()))
+        imageinfo = page.get("imageinfo", [])
+        if not imageinfo:
+            return None
+        return imageinfo[0].get("sha1")
+
+    def upload_file(
+        self, upload: UploadInfo, source: Union[Path, BinaryIO], comment: str = "Adding geolocation"
+    ) -> bool:
+        """Upload a new version of ``upload`` from a local path or a readable binary buffer.
+
+        Returns False without uploading when the bytes match the current version
+        (compared by SHA-1), which would otherwise add an identical revision
+        since uploads pass ``ignore=True``.
+        """
+        digest = hashlib.sha1()
+        with _open_for_upload(source) as fh:
+            for chunk in iter(lambda: fh.read(DOWNLOAD_CHUNK), b""):
+                digest.update(chunk)
+        if digest.hexdigest() == self.current_sha1(upload.title):
+            self._count("uploads_skipped")
+            self._logger.info("Skipping upload of %s: content is identical to the current version", upload.title)
+            return False
+
+        def send():
+            self.limiter.acquire_write()
+            self._ensure_login()
+            for attempt in range(2):
+                with _open_for_upload(source) as fh:
+                    try:
+                        self._site.upload(
+                            fh,
+                            filename=upload.title,
+                            description=None,
+                            comment=comment,
+                            ignore=True,
+                        )
+                        return
+                    except mwclient.errors.APIError as exc:
+                        if attempt == 0 and exc.code in SESSION_ERROR_CODES:
+                            self._refresh_login()
+                            continue
+                        self._note_api_error(exc)
+                        raise
+
+        # A dropped connection may still have stored the file, so uploads only repeat when refused.
+        self._with_retries(f"Upload {upload.title}", send, idempotent=False)
+        return True
+
+    def edit_page(self, title: str, text: str, summary: str, basetimestamp: Optional[str] = None) -> bool:
+        """Replace a page's wikitext under the write budget.
+
+        Returns True when the API reports Success. API errors (abusefilter,
+        editconflict, ...) propagate as mwclient.errors.APIError. ``basetimestamp``
+        (of the revision ``text`` was derived from) is required, so an edit never
+        runs without edit-conflict detection; ValueError is raised without it.
+        """
+        full_title = title if title.startswith("File:") else f"File:{title}"
+        if not basetimestamp:
+            raise ValueError(f"Refusing to edit {full_title} without the timestamp of the revision it was based on")
+        # Fail with editconflict if the page changed since the text was read
+        extra = {"basetimestamp": basetimestamp}
+        res = self._api(
+            "edit",
+            write=True,
+            title=full_title,
+            text=text,
+            summary=summary,
+            bot=True,
+            format="json",
+            **extra,
+        )
+        result = res.get("edit", {}).get("result")
+        if result != "Success":
+            self._logger.warning("Unexpected edit result for %s: %r", full_title, result)
+            return False
+        return True
 
     def cleanup(self):
+        self._shutdown_executor()
+        self._close_cache()
         if self._download_dir_ctx:
             self._download_dir_ctx.cleanup()
 
-    def cleanup_file(self, path: Path):
+    def cleanup_file(self, path: Union[Path, BinaryIO]):
+        """Delete a downloaded file, or close a buffer from ``download_original``."""
         try:
-            if path.exists():
-                path.unlink()
+            if isinstance(path, Path):
+                if path.exists():
+                    path.unlink()
+            else:
+                path.close()
         except OSError:
             pass
 
     def get_user_rights(self) -> set:
         if self._user_rights is not None:
             return self._user_rights
-        data = self._site.api("query", meta="userinfo", uiprop="rights", format="json")
+        self._ensure_login()
+        data = self._api("query", meta="userinfo", uiprop="rights", format="json")
         rights = set(data.get("query", {}).get("userinfo", {}).get("rights", []))
         self._user_rights = rights
         return rights
@@ -364,18 +1501,34 @@ class CommonsClient:
         return "deleterevision" in rights or "suppressrevision" in rights or "filedelete" in rights
 
     def fetch_sdc_description(self, title: str, lang: str) -> Optional[str]:
+        title = self._strip_file_prefix(title)
         try:
-            data = self._site.api(
-                "wbgetentities",
-                titles=f"File:{title}",
-                sites="commonswiki",
-                props="labels|descriptions",
-                languages=lang,
-                format="json",
-            )
+            if self._cache is None:
+                return self._query_sdc_description(title, lang)
+            revid = self._fetch_lastrevids([title]).get(title)
+            kind = f"sdc:{lang}"
+            if revid:
+                cached = self._cache.get_many(kind, {title: revid})
+                if title in cached:
+                    return cached[title]
+            value = self._query_sdc_description(title, lang)
+            if revid:
+                # Captions live in the page's mediainfo slot, so a caption edit bumps lastrevid too.
+                self._cache.put(kind, title, revid, value)
+            return value
         except Exception as exc:
             self._logger.warning("SDC fetch failed for %s: %s", title, exc)
             return None
+
+    def _query_sdc_description(self, title: str, lang: str) -> Optional[str]:
+        data = self._api(
+            "wbgetentities",
+            titles=f"File:{title}",
+            sites="commonswiki",
+            props="labels|descriptions",
+            languages=lang,
+            format="json",
+        )
         if not data or "entities" not in data:
             return None
         entity = next(iter(data["entities"].values()))
@@ -385,44 +1538,215 @@ class CommonsClient:
         return label or desc
 
     def list_category_files(
-        self, category: str, max_depth: int = 1, seen_titles: Optional[Set[str]] = None
+        self,
+        category: str,
+        max_depth: int = 1,
+        seen_titles: Optional[Iterable[str]] = None,
+        fields: Optional[Iterable[str]] = None,
+        generator: bool = False,
     ) -> List[UploadInfo]:
         """List files in a category (recursing into subcats up to max_depth)."""
-        queue = [(category, 0)]
-        seen = set(seen_titles) if seen_titles else set()
-        results: List[UploadInfo] = []
-        while queue:
-            cat, depth = queue.pop(0)
+        return [
+            upload
+            for upload, _ in self.iter_category_files(
+                category, max_depth=max_depth, seen_titles=seen_titles, fields=fields, generator=generator
+            )
+        ]
+
+    def iter_search_files(
+        self,
+        queries: Iterable[str],
+        seen_titles: Optional[Iterable[str]] = None,
+        fields: Optional[Iterable[str]] = None,
+    ) -> Iterator[Tuple[UploadInfo, Optional[dict]]]:
+        """Yield ``(upload, cont)`` for files matched by CirrusSearch ``queries``.
+
+        Uses ``generator=search`` in the File namespace, so matches arrive with
+        their metadata. A file matched by several queries is yielded once. The
+        search index trails edits by a few minutes, so callers should still check
+        the wikitext before editing.
+        """
+        wanted = ALL_FIELDS if fields is None else frozenset(fields)
+        seen = TitleSet(seen_titles)
+        for query in queries:
+            params = {
+                "action": "query",
+                "generator": "search",
+                "gsrsearch": query,
+                "gsrnamespace": "6",
+                "gsrlimit": "max",
+            }
             cont_token = None
-            while True:
-                params = {
-                    "action": "query",
-                    "list": "categorymembers",
-                    "cmtitle": f"Category:{cat}",
-                    "cmtype": "file|subcat",
-                    "cmlimit": "max",
-                }
-                if cont_token:
-                    params.update(cont_token)
-                data = self._site.api(**params)
-                if not data or "query" not in data or "categorymembers" not in data["query"]:
-                    break
-                subcats = []
-                titles = []
-                for item in data["query"]["categorymembers"]:
-                    title = item.get("title")
-                    if item.get("ns") == 14 and depth < max_depth:
-                        subcats.append(title.replace("Category:", "", 1))
-                    elif item.get("ns") == 6 and title not in seen:
-                        titles.append(title)
-                        seen.add(title)
-                for i in range(0, len(titles), 50):
-                    batch = titles[i : i + 50]
-                    results.extend(self._fetch_pages_batch(batch))
-                for sc in subcats:
-                    queue.append((sc, depth + 1))
-                if "continue" not in data:
-                    break
-                cont_token = data["continue"]
-                time.sleep(randrange(1))
-        return results
+            for pages, next_token in self._iter_generator(params, wanted):
+                for upload in self._generator_uploads(pages, wanted, seen):
+                    yield upload, cont_token
+                cont_token = next_token
+
+    def plan_category_tree(self, category: str, max_depth: int = 1) -> CategoryPlan:
+        """Size a category tree level by level without listing its files.
+
+        Counts come from ``prop=categoryinfo`` in 50-title batches. Only categories
+        that report subcategories are listed (``cmtype=subcat``) to find the next
+        level, and both kinds of request run on the worker pool.
+        """
+        root = _category_name(category)
+        plan = CategoryPlan(root=root, max_depth=max_depth)
+        parent_of: Dict[str, str] = {}
+        level = [root]
+        depth = 0
+        executor = self._get_executor()
+        while level:
+            for category_name in level:
+                plan.depth[category_name] = depth
+            infos = [
+                executor.submit(self._category_info, level[i : i + BATCH_SIZE]) for i in range(0, len(level), BATCH_SIZE)
+            ]
+            for future in infos:
+                for category_name, (files, subcats) in future.result().items():
+                    plan.files[category_name] = files
+                    plan.subcats[category_name] = subcats
+            if depth >= max_depth:
+                break
+            parents = [c for c in level if plan.subcats.get(c)]
+            listed = [executor.submit(self._list_subcategories, c) for c in parents]
+            next_level: List[str] = []
+            for parent, future in zip(parents, listed):
+                for sub in future.result():
+                    if sub not in plan.depth:
+                        plan.depth[sub] = depth + 1
+                        parent_of[sub] = parent
+                        next_level.append(sub)
+            level = next_level
+            depth += 1
+        # Children were recorded at their first (shallowest) parent; sum subtrees bottom-up.
+        for category_name in plan.depth:
+            plan.branch_files[category_name] = plan.files.get(category_name, 0)
+        for category_name in sorted(parent_of, key=lambda c: -plan.depth[c]):
+            plan.branch_files[parent_of[category_name]] += plan.branch_files[category_name]
+        return plan
+
+    def _category_info(self, categories: List[str]) -> Dict[str, Tuple[int, int]]:
+        """(files, subcats) per category name for up to 50 categories."""
+        titles = {f"Category:{c}": c for c in categories}
+        data = self._api("query", prop="categoryinfo", titles="|".join(titles))
+        query = (data or {}).get("query", {})
+        normalized = {n.get("to"): n.get("from") for n in query.get("normalized", [])}
+        counts = {c: (0, 0) for c in categories}
+        for page in query.get("pages", {}).values():
+            asked = normalized.get(page.get("title"), page.get("title"))
+            info = page.get("categoryinfo") or {}
+            counts[titles.get(asked, _category_name(asked or ""))] = (info.get("files", 0), info.get("subcats", 0))
+        return counts
+
+    def _list_subcategories(self, category: str) -> List[str]:
+        params = {
+            "action": "query",
+            "list": "categorymembers",
+            "cmtitle": f"Category:{category}",
+            "cmtype": "subcat",
+            "cmlimit": "max",
+        }
+        names: List[str] = []
+        while True:
+            data = self._api(**params)
+            members = (data or {}).get("query", {}).get("categorymembers", [])
+            names.extend(_category_name(m.get("title", "")) for m in members)
+            if not data or "continue" not in data:
+                return names
+            params.update(data["continue"])
+
+    def iter_category_files(
+        self,
+        category: str,
+        max_depth: int = 1,
+        seen_titles: Optional[Iterable[str]] = None,
+        fields: Optional[Iterable[str]] = None,
+        generator: bool = False,
+        frontier: Optional[CategoryFrontier] = None,
+        checkpoint: Optional[Callable[[CategoryFrontier], None]] = None,
+    ) -> Iterator[Tuple[UploadInfo, Optional[dict]]]:
+        """Yield ``(upload, cont)`` for files in a category tree as batches arrive.
+
+        ``cont`` is the listing continuation of the category page the upload came from.
+        The tree is walked breadth-first in rounds: up to ``max_workers`` pending
+        category pages are listed concurrently, and each category is visited once
+        however many parents link to it. The next round is listed while the
+        current round's metadata batches are in flight. With ``generator=True``
+        members and their metadata come from one ``generator=categorymembers``
+        stream instead of a listing plus batch lookups.
+
+        A caller-supplied ``frontier`` is resumed and advanced in place; it runs
+        ahead of the files being yielded, so save it only from ``checkpoint``,
+        which is called once every file of a round has been yielded.
+        """
+        wanted = ALL_FIELDS if fields is None else frozenset(fields)
+        if frontier is None:
+            frontier = CategoryFrontier.start(category)
+        seen = TitleSet(seen_titles)
+        emitted = TitleSet()
+        executor = self._get_executor()
+
+        def list_round() -> Tuple[List[Tuple[str, int, Optional[dict]]], List[Future]]:
+            batch = list(islice(frontier.pending, self._max_workers))
+            return batch, [executor.submit(self._list_category_page, cat, cont, wanted, generator) for cat, _, cont in batch]
+
+        batch, listed = list_round()
+        while batch:
+            pages = [future.result() for future in listed]
+            ready: List[Tuple[UploadInfo, Optional[dict]]] = []
+            in_flight: List[Tuple[Future, Optional[dict]]] = []
+            for (_, _, cont), (members, _, _) in zip(batch, pages):
+                if generator:
+                    ready.extend((upload, cont) for upload in self._generator_uploads(members, wanted, seen))
+                else:
+                    in_flight.extend((future, cont) for future in self._submit_batches(members, seen=seen, fields=fields))
+            frontier.advance(batch, pages, max_depth)
+            batch, listed = list_round()
+            yield from ready
+            for future, cont in in_flight:
+                for upload in self._iter_batches([future], emitted):
+                    yield upload, cont
+            if checkpoint is not None:
+                checkpoint(frontier)
+
+    def _list_category_page(
+        self, category: str, cont: Optional[dict], fields: FrozenSet[str], generator: bool
+    ) -> CategoryPage:
+        """One page of a category listing: (file members, subcategory names, next continuation).
+
+        File members are titles, or page dicts carrying ``fields`` in generator mode.
+        """
+        subcats: List[str] = []
+        if generator:
+            params = {
+                "action": "query",
+                "generator": "categorymembers",
+                "gcmtitle": f"Category:{category}",
+                "gcmtype": "file|subcat",
+                "gcmlimit": "max",
+            }
+            pages, next_cont = next(self._iter_generator(params, fields, cont), ([], None))
+            for page in pages:
+                if page.get("ns") == 14:
+                    subcats.append(_category_name(page.get("title", "")))
+            return [page for page in pages if page.get("ns") == 6], subcats, next_cont
+        params = {
+            "action": "query",
+            "list": "categorymembers",
+            "cmtitle": f"Category:{category}",
+            "cmtype": "file|subcat",
+            "cmlimit": "max",
+        }
+        if cont:
+            params.update(cont)
+        data = self._api(**params)
+        if not data or "query" not in data or "categorymembers" not in data["query"]:
+            return [], [], None
+        titles: List[str] = []
+        for item in data["query"]["categorymembers"]:
+            title = item.get("title")
+            if item.get("ns") == 14:
+                subcats.append(_category_name(title))
+            elif item.get("ns") == 6:
+                titles.append(title)
+        return titles, subcats, data.get("continue")
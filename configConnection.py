@@ -100,6 +100,7 @@ class ConfigConnection:
             host="commons.wikimedia.org",
             path="/w/",
             scheme="https",
+            pool=self._s,
             clients_useragent="AddGeoLocationBot/1.0 (https://github.com/wilfredor/addwikigeolocation; wilfredor@gmail.com)",
         )
         self._site.login(self._login, self._password)
@@ -167,11 +168,6 @@ class ConfigConnection:
 
         file_url = self._info["url"]
 
-        # Wikimedia requires a proper User-Agent
-        headers = {
-            "User-Agent": "AddGeoLocationBot/1.0 (https://github.com/wilfredor/addwikigeolocation; wilfredor@gmail.com)"
-        }
-
         try:
             # If the file already exists, remove it before downloading
             if self._local_path and self._local_path.exists():
@@ -179,8 +175,8 @@ class ConfigConnection:
 
             print(f"Downloading from: {file_url}")
 
-            # Perform the request with User-Agent
-            with requests.get(file_url, headers=headers, stream=True, timeout=10) as r:
+            # Reuse the session (User-Agent and keep-alive connection) shared with mwclient
+            with self._s.get(file_url, stream=True, timeout=10) as r:
                 r.raise_for_status()  # Raise an error if the request fails
 
                 # Save the file in binary mode
@@ -0,0 +1,378 @@
+"""EXIF (APP1) segment surgery on JPEG bytes.
+
+Only the segments in front of the image data are parsed; everything after the
+EXIF segment is copied through untouched. GPS edits touch only the GPS IFD
+and its pointer in IFD0; piexif is the fallback for EXIF data that cannot be
+followed safely.
+"""
+from __future__ import annotations
+
+import io
+import shutil
+import struct
+from typing import BinaryIO, Callable, Dict, Iterable, Optional, Tuple
+
+import piexif
+
+SOI = b"\xff\xd8"
+APP0 = 0xE0
+APP1 = 0xE1
+EXIF_HEADER = b"Exif\x00\x00"
+# The segment length field is 16 bits and counts itself.
+MAX_SEGMENT_PAYLOAD = 0xFFFF - 2
+COPY_CHUNK = 1 << 20
+
+
+class JpegError(ValueError):
+    """Input is not a JPEG this module can edit."""
+
+
+def _read_exact(src: BinaryIO, n: int) -> bytes:
+    data = src.read(n)
+    if len(data) != n:
+        raise JpegError("Truncated JPEG header")
+    return data
+
+
+def read_head(src: BinaryIO) -> Tuple[bytes, int, int]:
+    """Read the JPEG head from ``src`` up to the EXIF segment or the first non-APP marker.
+
+    Returns ``(head, start, end)``: ``head[start:end]`` is the existing EXIF APP1
+    segment, or ``start == end`` marks where a new one belongs (after SOI and a
+    leading JFIF APP0). ``src`` is left positioned right after ``head``.
+    """
+    head = bytearray(_read_exact(src, 2))
+    if bytes(head) != SOI:
+        raise JpegError("Missing JPEG SOI marker")
+    insert_at = len(head)
+    while True:
+        marker = _read_exact(src, 2)
+        while marker[0] == 0xFF and marker[1] == 0xFF:
+            # Fill bytes before a marker
+            head.append(0xFF)
+            marker = marker[1:] + _read_exact(src, 1)
+        if marker[0] != 0xFF:
+            raise JpegError("Malformed JPEG marker")
+        code = marker[1]
+        seg_start = len(head)
+        head += marker
+        if not (0xE0 <= code <= 0xEF or code == 0xFE):
+            # Tables/frame/scan data: no EXIF segment in front of the image.
+            return bytes(head), insert_at, insert_at
+        length_bytes = _read_exact(src, 2)
+        (length,) = struct.unpack(">H", length_bytes)
+        if length < 2:
+            raise JpegError("Malformed JPEG segment length")
+        body = _read_exact(src, length - 2)
+        head += length_bytes + body
+        if code == APP1 and body.startswith(EXIF_HEADER):
+            return bytes(head), seg_start, len(head)
+        if code == APP0 and seg_start == insert_at:
+            insert_at = len(head)
+
+
+def app1_segment(payload: bytes) -> bytes:
+    if len(payload) > MAX_SEGMENT_PAYLOAD:
+        raise JpegError(f"EXIF payload of {len(payload)} bytes does not fit in one APP1 segment")
+    return b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+
+
+ExifEdit = Callable[[Optional[bytes]], Optional[bytes]]
+
+
+def rewrite_exif(src: BinaryIO, dst: BinaryIO, edit: ExifEdit) -> bool:
+    """Copy a JPEG from ``src`` to ``dst`` with its EXIF payload replaced by ``edit``.
+
+    ``edit`` gets the current payload (``Exif\\0\\0`` + TIFF data, or None) and
+    returns the new one, None to drop the segment, or the same object to keep it.
+    Returns whether the EXIF changed; the rest of the file is copied unchanged.
+    """
+    head, start, end = read_head(src)
+    old = head[start + 4 : end] if end > start else None
+    new = edit(old)
+    dst.write(head[:start])
+    if new is not None:
+        dst.write(app1_segment(new))
+    dst.write(head[end:])
+    shutil.copyfileobj(src, dst, COPY_CHUNK)
+    return new is not old and new != old
+
+
+class ChunkReader(io.RawIOBase):
+    """Readable file over an iterable of byte chunks (e.g. ``Response.iter_content``).
+
+    Lets ``rewrite_exif`` patch a download as it arrives; at most one chunk is
+    held at a time.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = chunk
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+
+def stream_reader(chunks: Iterable[bytes]) -> BinaryIO:
+    return io.BufferedReader(ChunkReader(chunks), COPY_CHUNK)
+
+
+def rewrite_exif_bytes(data: bytes, edit: ExifEdit) -> Tuple[bytes, bool]:
+    """Bytes-in/bytes-out form of ``rewrite_exif``."""
+    out = io.BytesIO()
+    changed = rewrite_exif(io.BytesIO(data), out, edit)
+    return out.getvalue(), changed
+
+
+def decimal_to_dms(decimal: float) -> Tuple[int, int, float]:
+    minutes_float, seconds = divmod(abs(decimal) * 3600, 60)
+    degrees, minutes = divmod(minutes_float, 60)
+    return int(degrees), int(minutes), seconds
+
+
+def gps_ifd(lat: float, lon: float) -> Dict[int, object]:
+    """GPS IFD entries for a position, seconds kept to 1/1000."""
+    lat_d, lat_m, lat_s = decimal_to_dms(lat)
+    lon_d, lon_m, lon_s = decimal_to_dms(lon)
+    return {
+        piexif.GPSIFD.GPSLatitudeRef: "N" if lat >= 0 else "S",
+        piexif.GPSIFD.GPSLatitude: ((lat_d, 1), (lat_m, 1), (int(min(lat_s, 60) * 1000), 1000)),
+        piexif.GPSIFD.GPSLongitudeRef: "E" if lon >= 0 else "W",
+        piexif.GPSIFD.GPSLongitude: ((lon_d, 1), (lon_m, 1), (int(min(lon_s, 60) * 1000), 1000)),
+    }
+
+
+GPS_POINTER_TAG = 0x8825
+# Bytes per value for each TIFF field type.
+TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8}
+TYPE_BYTE, TYPE_ASCII, TYPE_LONG, TYPE_RATIONAL = 1, 2, 4, 5
+
+
+class _Tiff:
+    """Mutable TIFF blob from an EXIF payload, edited only where the GPS IFD is referenced."""
+
+    def __init__(self, payload: Optional[bytes]):
+        if payload is None:
+            # Smallest valid TIFF: little-endian header and an empty IFD0 at offset 8.
+            self.buf = bytearray(b"II*\x00\x08\x00\x00\x00" + b"\x00" * 6)
+        elif payload.startswith(EXIF_HEADER):
+            self.buf = bytearray(payload[len(EXIF_HEADER) :])
+        else:
+            raise JpegError("EXIF payload without Exif header")
+        order = bytes(self.buf[:2])
+        if order == b"II":
+            self.order = "<"
+        elif order == b"MM":
+            self.order = ">"
+        else:
+            raise JpegError("Unknown TIFF byte order")
+        if self.u16(2) != 42:
+            raise JpegError("Bad TIFF magic")
+
+    def _check(self, offset: int, size: int):
+        if offset < 8 or offset + size > len(self.buf):
+            raise JpegError("EXIF offset out of range")
+
+    def u16(self, offset: int) -> int:
+        return struct.unpack_from(self.order + "H", self.buf, offset)[0]
+
+    def u32(self, offset: int) -> int:
+        return struct.unpack_from(self.order + "I", self.buf, offset)[0]
+
+    def put32(self, offset: int, value: int):
+        struct.pack_into(self.order + "I", self.buf, offset, value)
+
+    def payload(self) -> bytes:
+        return EXIF_HEADER + bytes(self.buf)
+
+    def ifd0(self) -> Tuple[int, int]:
+        """(offset, entry count) of IFD0."""
+        offset = self.u32(4)
+        self._check(offset, 2)
+        count = self.u16(offset)
+        self._check(offset, 2 + 12 * count + 4)
+        return offset, count
+
+    def find_entry(self, ifd: int, count: int, tag: int) -> Optional[int]:
+        for i in range(count):
+            entry = ifd + 2 + 12 * i
+            if self.u16(entry) == tag:
+                return entry
+        return None
+
+    def zero_ifd(self, offset: int):
+        """Overwrite an IFD and the out-of-line values its entries point to."""
+        self._check(offset, 2)
+        count = self.u16(offset)
+        self._check(offset, 2 + 12 * count + 4)
+        for i in range(count):
+            entry = offset + 2 + 12 * i
+            size = TIFF_TYPE_SIZES.get(self.u16(entry + 2), 1) * self.u32(entry + 4)
+            if size > 4:
+                value = self.u32(entry + 8)
+                self._check(value, size)
+                self.buf[value : value + size] = bytes(size)
+        self.buf[offset : offset + 2 + 12 * count + 4] = bytes(2 + 12 * count + 4)
+
+    def append(self, build: Callable[[int], bytes]) -> int:
+        """Append ``build(offset)`` at the next word boundary and return that offset."""
+        if len(self.buf) % 2:
+            self.buf.append(0)
+        offset = len(self.buf)
+        self.buf += build(offset)
+        return offset
+
+    def gps_ifd_bytes(self, lat: float, lon: float) -> Callable[[int], bytes]:
+        def rationals(value: float) -> bytes:
+            d, m, sec = decimal_to_dms(value)
+            return struct.pack(self.order + "6I", d, 1, m, 1, int(min(sec, 60) * 1000), 1000)
+
+        def entry(tag: int, type_: int, count: int, value: bytes) -> bytes:
+            return struct.pack(self.order + "HHI", tag, type_, count) + value.ljust(4, b"\x00")
+
+        def build(offset: int) -> bytes:
+            n = 5
+            data_at = offset + 2 + 12 * n + 4
+            pointer = lambda extra: struct.pack(self.order + "I", data_at + extra)  # noqa: E731
+            return (
+                struct.pack(self.order + "H", n)
+                + entry(0, TYPE_BYTE, 4, b"\x02\x03\x00\x00")  # GPSVersionID 2.3
+                + entry(1, TYPE_ASCII, 2, b"N\x00" if lat >= 0 else b"S\x00")
+                + entry(2, TYPE_RATIONAL, 3, pointer(0))
+                + entry(3, TYPE_ASCII, 2, b"E\x00" if lon >= 0 else b"W\x00")
+                + entry(4, TYPE_RATIONAL, 3, pointer(24))
+                + struct.pack(self.order + "I", 0)
+                + rationals(lat)
+                + rationals(lon)
+            )
+
+        return build
+
+
+def set_gps_tiff(payload: Optional[bytes], lat: float, lon: float) -> bytes:
+    """Write a GPS IFD without decoding the rest of the EXIF data.
+
+    The new GPS IFD is appended to the TIFF blob and the old one, if any, is
+    zeroed. An existing GPS pointer is patched in place; otherwise IFD0 is copied
+    to the end with the pointer added, since it cannot grow where it is. All
+    other bytes (maker notes, thumbnail, their offsets) stay where they were.
+    """
+    tiff = _Tiff(payload)
+    ifd0, count = tiff.ifd0()
+    entry = tiff.find_entry(ifd0, count, GPS_POINTER_TAG)
+    if entry is not None:
+        tiff.zero_ifd(tiff.u32(entry + 8))
+    gps = tiff.append(tiff.gps_ifd_bytes(lat, lon))
+    if entry is not None:
+        tiff.put32(entry + 8, gps)
+        return tiff.payload()
+    entries = [bytes(tiff.buf[ifd0 + 2 + 12 * i : ifd0 + 14 + 12 * i]) for i in range(count)]
+    entries.append(struct.pack(tiff.order + "HHII", GPS_POINTER_TAG, TYPE_LONG, 1, gps))
+    entries.sort(key=lambda e: struct.unpack_from(tiff.order + "H", e)[0])
+    next_ifd = bytes(tiff.buf[ifd0 + 2 + 12 * count : ifd0 + 6 + 12 * count])
+    moved = struct.pack(tiff.order + "H", len(entries)) + b"".join(entries) + next_ifd
+    tiff.put32(4, tiff.append(lambda _offset: moved))
+    return tiff.payload()
+
+
+def remove_gps_tiff(payload: Optional[bytes]) -> Optional[bytes]:
+    """Zero the GPS IFD and drop its pointer from IFD0 in place; the payload keeps its size.
+
+    Returns ``payload`` itself when there is no GPS IFD.
+    """
+    if not payload:
+        return payload
+    tiff = _Tiff(payload)
+    ifd0, count = tiff.ifd0()
+    entry = tiff.find_entry(ifd0, count, GPS_POINTER_TAG)
+    if entry is None:
+        return payload
+    tiff.zero_ifd(tiff.u32(entry + 8))
+    end = ifd0 + 2 + 12 * count + 4
+    # Shift the following entries and the next-IFD offset down over the pointer entry.
+    tiff.buf[entry : end - 12] = tiff.buf[entry + 12 : end]
+    tiff.buf[end - 12 : end] = bytes(12)
+    struct.pack_into(tiff.order + "H", tiff.buf, ifd0, count - 1)
+    return tiff.payload()
+
+
+def has_gps(payload: Optional[bytes]) -> bool:
+    """Whether an EXIF payload has a GPS IFD with at least one entry."""
+    if not payload:
+        return False
+    try:
+        tiff = _Tiff(payload)
+        ifd0, count = tiff.ifd0()
+        entry = tiff.find_entry(ifd0, count, GPS_POINTER_TAG)
+        if entry is None:
+            return False
+        gps = tiff.u32(entry + 8)
+        tiff._check(gps, 2)
+        return tiff.u16(gps) > 0
+    except (JpegError, struct.error):
+        try:
+            return bool(piexif.load(payload).get("GPS"))
+        except (ValueError, struct.error) as exc:
+            raise JpegError(f"Unreadable EXIF: {exc}") from exc
+
+
+def _piexif_set_gps(payload: Optional[bytes], lat: float, lon: float) -> bytes:
+    exif = piexif.load(payload) if payload else {"0th": {}, "Exif": {}, "GPS": {}, "1st": {}, "thumbnail": None}
+    exif["GPS"] = gps_ifd(lat, lon)
+    return piexif.dump(exif)
+
+
+def _piexif_remove_gps(payload: bytes) -> bytes:
+    exif = piexif.load(payload)
+    if not exif.get("GPS"):
+        return payload
+    exif["GPS"] = {}
+    return piexif.dump(exif)
+
+
+def set_gps_edit(lat: float, lon: float) -> ExifEdit:
+    """EXIF edit that sets the GPS IFD, keeping every other tag.
+
+    Uses the minimal writer; piexif re-encodes the payload only when the EXIF
+    structure cannot be followed or the grown payload would not fit in APP1.
+    """
+
+    def edit(payload: Optional[bytes]) -> bytes:
+        try:
+            patched = set_gps_tiff(payload, lat, lon)
+            if len(patched) <= MAX_SEGMENT_PAYLOAD:
+                return patched
+        except (JpegError, struct.error):
+            pass
+        return _piexif_set_gps(payload, lat, lon)
+
+    return edit
+
+
+def remove_gps_edit(payload: Optional[bytes]) -> Optional[bytes]:
+    """EXIF edit that drops the GPS IFD; files without GPS are left as they are."""
+    if not payload:
+        return payload
+    try:
+        return remove_gps_tiff(payload)
+    except (JpegError, struct.error):
+        return _piexif_remove_gps(payload)
+
+
+def with_gps(data: bytes, lat: float, lon: float) -> bytes:
+    return rewrite_exif_bytes(data, set_gps_edit(lat, lon))[0]
+
+
+def without_gps(data: bytes) -> Tuple[bytes, bool]:
+    return rewrite_exif_bytes(data, remove_gps_edit)
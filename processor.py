@@ -1,25 +1,29 @@
 from __future__ import annotations
 
+import queue
 import random
-import time
+import threading
 from pathlib import Path
-from typing import Tuple
+from typing import Optional, Tuple
 
 from tqdm import tqdm
 import logging
 
 from commons_client import CommonsClient, UploadInfo
 from scanner import ScanState, save_state
+from state_store import STATUS_DONE, STATUS_FAILED, STATUS_SKIPPED
 
+DEFAULT_DOWNLOAD_WORKERS = 2
+# Files held between stages; bounds memory while the upload stage waits on the write budget.
+DEFAULT_PREFETCH = 4
 
-def rate_limit_sleep(edit_timestamps, max_edits_per_min, base_sleep):
-    now = time.time()
-    edit_timestamps[:] = [t for t in edit_timestamps if now - t < 60]
-    if len(edit_timestamps) >= max_edits_per_min:
-        sleep_for = 60 - (now - edit_timestamps[0])
-        time.sleep(max(sleep_for, 1))
-    edit_timestamps.append(time.time())
-    time.sleep(random.uniform(base_sleep * 0.5, base_sleep * 1.5))
+# Outcomes reported by the pipeline stages to the main thread.
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+_DONE = object()
 
 
 def process_needs_exif(
@@ -27,72 +31,140 @@ def process_needs_exif(
     state: ScanState,
     state_path: Path,
     count: int,
-    base_sleep: float,
-    max_edits_per_min: int,
     upload: bool,
+    download_workers: int = DEFAULT_DOWNLOAD_WORKERS,
+    prefetch: int = DEFAULT_PREFETCH,
 ) -> Tuple[int, int, int, int]:
-    edits_count = count
+    """Download, geotag and re-upload the files in ``state.needs_exif``.
+
+    Downloads and uploads run as separate stages connected by a bounded queue,
+    so the next originals are fetched while an upload is in flight. The GPS is
+    written into the EXIF while each original streams in, and files travel as
+    in-memory buffers (spooled to disk only when large), so the usual photo
+    never touches the filesystem and is copied once.
+    The upload stage is paced only by the client's write limiter. Stages report
+    back to this thread, which alone touches ``state`` and commits one row per
+    file; files left in the queues after ``count`` edits are deleted and stay in
+    ``needs_exif``.
+    """
     updated = 0
     skipped_has_gps = 0
     skipped_no_gps = 0
     errors = 0
 
-    images = list(state.needs_exif)
+    images = list(state.needs_exif.values())
     random.shuffle(images)
-    edit_timestamps = []
     total_images = len(images)
 
     progress = tqdm(total=total_images, unit="file", desc="Processing", leave=True, colour="green")
 
-    for idx, upload_info in enumerate(images, start=1):
-        local_path = None
-        try:
-            if not upload_info.has_coords:
-                skipped_no_gps += 1
-                progress.write(f"[{idx}/{total_images}] Skipping {upload_info.title} (no page coordinates)")
-                state.needs_exif.remove(upload_info)
-                save_state(state_path, state)
-                progress.update(1)
-                continue
-            if upload_info.has_exif_gps:
-                skipped_has_gps += 1
-                progress.write(f"[{idx}/{total_images}] Skipping {upload_info.title} (GPS already present)")
-                state.needs_exif.remove(upload_info)
-                save_state(state_path, state)
-                progress.update(1)
-                continue
+    todo = []
+    for upload_info in images:
+        if not upload_info.has_coords:
+            skipped_no_gps += 1
+            progress.write(f"Skipping {upload_info.title} (no page coordinates)")
+        elif upload_info.has_exif_gps:
+            skipped_has_gps += 1
+            progress.write(f"Skipping {upload_info.title} (GPS already present)")
+        else:
+            todo.append(upload_info)
+            continue
+        state.resolve(upload_info.title, STATUS_SKIPPED)
+        progress.update(1)
+    if skipped_has_gps or skipped_no_gps:
+        save_state(state_path, state)
 
-            progress.write(f"[{idx}/{total_images}] processing: {upload_info.title}")
-            local_path = client.download_file(upload_info)
-            if not local_path:
-                errors += 1
-                progress.write(f" Could not download {upload_info.title}")
-            else:
+    limit: Optional[int] = count if count > 0 else None
+    if not todo:
+        progress.close()
+        return updated, skipped_has_gps, skipped_no_gps, errors
+
+    stop = threading.Event()
+    pending: "queue.Queue[UploadInfo]" = queue.Queue()
+    for upload_info in todo:
+        pending.put(upload_info)
+    written: queue.Queue = queue.Queue(maxsize=max(1, prefetch))
+    results: queue.Queue = queue.Queue()
+    n_downloaders = max(1, min(download_workers, len(todo)))
+
+    def download_stage():
+        try:
+            while not stop.is_set():
+                try:
+                    upload_info = pending.get_nowait()
+                except queue.Empty:
+                    break
                 try:
-                    client.write_exif(upload_info, local_path)
-                    if upload:
-                        client.upload_file(upload_info, local_path)
-                    updated += 1
-                    edits_count -= 1
+                    patched = client.download_with_gps(upload_info)
                 except Exception as exc:
-                    errors += 1
-                    progress.write(f"Error writing/uploading {upload_info.title}: {exc}")
-            if upload_info in state.needs_exif:
-                state.needs_exif.remove(upload_info)
-            save_state(state_path, state)
-        except Exception as exc:
-            errors += 1
-            progress.write(f"Error processing {upload_info.title}: {exc}")
-            logging.exception("Error processing %s", upload_info.title)
+                    logging.exception("Error downloading %s", upload_info.title)
+                    results.put((upload_info, FAILED, f"Error downloading {upload_info.title}: {exc}"))
+                    continue
+                if patched is None:
+                    results.put((upload_info, FAILED, f" Could not download {upload_info.title}"))
+                    continue
+                written.put((upload_info, patched))
         finally:
-            if local_path:
-                client.cleanup_file(local_path)
+            written.put(_DONE)
 
-        progress.update(1)
-        if edits_count == 0:
-            break
-        rate_limit_sleep(edit_timestamps, max_edits_per_min, base_sleep)
+    def upload_stage():
+        done = 0
+        finished = 0
+        while finished < n_downloaders:
+            item = written.get()
+            if item is _DONE:
+                finished += 1
+                continue
+            upload_info, patched = item
+            try:
+                if stop.is_set() or (limit is not None and done >= limit):
+                    results.put((upload_info, CANCELLED, None))
+                    continue
+                if upload and not client.upload_file(upload_info, patched):
+                    results.put((upload_info, UNCHANGED, f"Skipping {upload_info.title} (identical to current version)"))
+                    continue
+                done += 1
+                results.put((upload_info, UPDATED, f"Updated {upload_info.title}"))
+            except Exception as exc:
+                results.put((upload_info, FAILED, f"Error uploading {upload_info.title}: {exc}"))
+            finally:
+                client.cleanup_file(patched)
+        results.put(_DONE)
+
+    threads = [threading.Thread(target=download_stage, name=f"download-{i}", daemon=True) for i in range(n_downloaders)]
+    threads.append(threading.Thread(target=upload_stage, name="upload", daemon=True))
+    for thread in threads:
+        thread.start()
 
-    progress.close()
+    try:
+        while True:
+            item = results.get()
+            if item is _DONE:
+                break
+            upload_info, outcome, message = item
+            if message:
+                progress.write(message)
+            if outcome == CANCELLED:
+                continue
+            if outcome == UPDATED:
+                updated += 1
+                state.resolve(upload_info.title, STATUS_DONE)
+            elif outcome == UNCHANGED:
+                # The current version already carries exactly these coordinates.
+                skipped_has_gps += 1
+                state.resolve(upload_info.title, STATUS_SKIPPED)
+            else:
+                errors += 1
+                state.resolve(upload_info.title, STATUS_FAILED)
+            save_state(state_path, state)
+            progress.update(1)
+            if limit is not None and updated >= limit:
+                stop.set()
+    finally:
+        # On Ctrl-C too: let the stages drain so every downloaded original is removed.
+        stop.set()
+        for thread in threads:
+            thread.join()
+        progress.close()
 
     return updated, skipped_has_gps, skipped_no_gps, errors
@@ -3,15 +3,23 @@ from __future__ import annotations
 import csv
 import logging
 import re
-import time
 from pathlib import Path
-from typing import List, Optional, Set
+from typing import Iterable, List, Optional, Set
 
 import typer
 from tqdm import tqdm
-import piexif
 
-from commons_client import CommonsClient, UploadInfo
+import jpeg_exif
+
+from commons_client import (
+    CommonsClient,
+    RateLimiter,
+    UploadInfo,
+    DEFAULT_MAX_WORKERS,
+    FIELD_AUTHOR,
+    FIELD_EXIF_GPS,
+    FIELD_URL,
+)
 
 app = typer.Typer(add_completion=False)
 
@@ -52,18 +60,6 @@ def strip_geo_templates(text: str) -> tuple[str, bool]:
     return new_text, modified
 
 
-def remove_exif_gps(file_path: Path) -> bool:
-    """Return True if GPS was removed or was absent."""
-    file_str = str(file_path)
-    exif_dict = piexif.load(file_str)
-    if "GPS" in exif_dict and exif_dict["GPS"]:
-        exif_dict["GPS"] = {}
-        exif_bytes = piexif.dump(exif_dict)
-        piexif.insert(exif_bytes, file_str)
-        return True
-    return False
-
-
 @app.command()
 def main(
     file_list: Optional[Path] = typer.Option(None, "--file-list", help="CSV (title) or plain text list of files"),
@@ -71,6 +67,11 @@ def main(
     max_depth: int = typer.Option(1, "--max-depth", help="Category recursion depth"),
     author_filter: Optional[str] = typer.Option(None, "--author-filter", help="Filter by author name (extmetadata)"),
     remove_exif: bool = typer.Option(True, "--remove-exif/--keep-exif", help="Remove EXIF GPS"),
+    probe: bool = typer.Option(
+        True,
+        "--probe/--no-probe",
+        help="When metadata cannot tell, check the EXIF in the first 128 KB before downloading a whole file",
+    ),
     remove_page: bool = typer.Option(True, "--remove-page/--keep-page", help="Remove page geolocation templates"),
     purge_history: bool = typer.Option(False, "--purge-history", help="Admin only: purge older file revisions, keep latest"),
     apply: bool = typer.Option(False, "--apply", help="Apply changes (default: dry-run)"),
@@ -88,48 +89,87 @@ def main(
         hide_input=True,
     ),
     download_dir: Optional[Path] = typer.Option(None, "--download-dir", help="Directory for downloads (temp by default)"),
-    max_per_min: int = typer.Option(30, "--max-per-min", help="Max uploads per minute"),
+    max_per_min: int = typer.Option(30, "--max-per-min", help="Max uploads/edits per minute"),
+    workers: int = typer.Option(DEFAULT_MAX_WORKERS, "--workers", help="Metadata batches fetched concurrently while listing"),
+    cache_file: Optional[Path] = typer.Option(None, "--cache-file", help="SQLite cache of page metadata/wikitext, revalidated by revision id (off by default)"),
+    generator: bool = typer.Option(False, "--generator", help="Scan with API generators (listing and metadata in one request stream)"),
 ):
     """Remove GPS info (EXIF and page templates) from files."""
     logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     if not file_list and not category:
         raise typer.Exit("Provide --file-list or --category")
 
-    client = CommonsClient(commons_user, commons_pass, download_dir=str(download_dir) if download_dir else None)
-    uploads: List[UploadInfo] = []
+    client = CommonsClient(
+        commons_user,
+        commons_pass,
+        download_dir=str(download_dir) if download_dir else None,
+        max_workers=workers,
+        cache_path=str(cache_file) if cache_file else None,
+        rate_limiter=RateLimiter(writes_per_min=max_per_min),
+    )
+    fields = {FIELD_URL, FIELD_EXIF_GPS}
+    if author_filter:
+        fields.add(FIELD_AUTHOR)
+    uploads: Iterable[UploadInfo]
     if file_list:
         titles = load_file_list(file_list)
-        uploads = client.fetch_uploads_for_titles(titles)
+        uploads = client.fetch_uploads_for_titles(titles, fields=fields)
     else:
-        uploads = client.list_category_files(category, max_depth=max_depth)
+        # Stream category members so work starts with the first batch.
+        uploads = (
+            u
+            for u, _ in client.iter_category_files(category, max_depth=max_depth, fields=fields, generator=generator)
+        )
     # Filter by author if requested
     if author_filter:
-        uploads = [u for u in uploads if u.author and author_filter.lower() in u.author.lower()]
+        uploads = (u for u in uploads if u.author and author_filter.lower() in u.author.lower())
+    if file_list:
+        uploads = list(uploads)
+    total = len(uploads) if isinstance(uploads, list) else None
 
-    progress = tqdm(total=len(uploads), desc="Removing geo", unit="file", colour="yellow")
-    timestamps: List[float] = []
+    progress = tqdm(total=total, desc="Removing geo", unit="file", colour="yellow")
+    processed = 0
     done = 0
     errors = 0
-    for u in uploads:
+    if remove_page:
+        # Prefetch current wikitext a window of 50 pages at a time
+        paired = client.iter_with_wikitext(uploads)
+    else:
+        paired = ((u, None) for u in uploads)
+    for u, rev in paired:
+        processed += 1
         local = None
         try:
             changed = False
-            if remove_exif:
-                local = client.download_file(u)
-                if local:
-                    if remove_exif_gps(local):
+            exif_gps = u.has_exif_gps or u.exif_gps_uncertain
+            if remove_exif and exif_gps and not u.has_exif_gps and probe:
+                # Metadata missing or without usable coordinates: read the file head before downloading it all.
+                exif_gps = client.probe_exif_gps(u) is not False
+            if remove_exif and not exif_gps:
+                progress.write(f"No EXIF GPS in {u.title}")
+            elif remove_exif:
+                # GPS is stripped while the original streams in; only the EXIF segment is rewritten.
+                fetched = client.download_edited(u, jpeg_exif.remove_gps_edit)
+                if fetched:
+                    local, removed = fetched
+                    if not removed:
+                        progress.write(f"No EXIF GPS in {u.title}")
+                    elif not apply:
+                        changed = True
+                    elif client.upload_file(u, local, comment="Removing geolocation (EXIF)"):
                         changed = True
-                    if apply:
-                        client.upload_file(u, local, comment="Removing geolocation (EXIF)")
                 else:
                     progress.write(f"Skip download for {u.title}")
-            if remove_page:
-                page = client._site.pages[u.title]  # type: ignore
-                text = page.text()
+            if remove_page and (rev is None or not rev[2]):
+                # Never edit from text that was not read: it would blank the page.
+                errors += 1
+                progress.write(f"Could not read wikitext of {u.title}; page left unchanged")
+            elif remove_page:
+                text, _revid, rev_ts = rev
                 new_text, modified = strip_geo_templates(text)
                 if modified and apply:
-                    page.save(new_text, summary="Removing geolocation templates")
-                    changed = True
+                    if client.edit_page(u.title, new_text, "Removing geolocation templates", basetimestamp=rev_ts):
+                        changed = True
             if changed or not apply:
                 done += 1
         except Exception as exc:
@@ -137,14 +177,9 @@ def main(
             progress.write(f"Error on {u.title}: {exc}")
             logging.exception("Error removing geo from %s", u.title)
         finally:
-            if local:
+            if local is not None:
                 client.cleanup_file(local)
         progress.update(1)
-        now = time.time()
-        timestamps = [t for t in timestamps if now - t < 60]
-        if len(timestamps) >= max_per_min:
-            time.sleep(60 - (now - timestamps[0]))
-        timestamps.append(time.time())
     progress.close()
     if purge_history:
         if not client.can_purge_history():
@@ -152,7 +187,8 @@ def main(
         else:
             logging.warning("purge-history flag is set. Purging old revisions is not implemented for safety; do it manually.")
     client.cleanup()
-    print(f"Done. Processed: {len(uploads)}, successful/preview: {done}, errors: {errors}, apply={apply}")
+    print(f"Done. Processed: {processed}, successful/preview: {done}, errors: {errors}, apply={apply}")
+    print(client.stats_summary())
 
 
 if __name__ == "__main__":
@@ -2,14 +2,13 @@ from __future__ import annotations
 
 import csv
 import logging
-import time
 from pathlib import Path
 from typing import Optional
 
 import typer
 from tqdm import tqdm
 
-from commons_client import CommonsClient, UploadInfo
+from commons_client import CommonsClient, RateLimiter, UploadInfo
 from datetime import datetime, timezone, timedelta
 
 app = typer.Typer(add_completion=False)
@@ -67,7 +66,12 @@ def main(
         level=logging.INFO,
         format="%(asctime)s %(levelname)s %(name)s: %(message)s",
     )
-    client = CommonsClient(commons_user, commons_pass, download_dir=str(download_dir) if download_dir else None)
+    client = CommonsClient(
+        commons_user,
+        commons_pass,
+        download_dir=str(download_dir) if download_dir else None,
+        rate_limiter=RateLimiter(writes_per_min=max_per_min),
+    )
     if since is None:
         today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
         since = today.strftime("%Y-%m-%dT%H:%M:%SZ")
@@ -76,14 +80,14 @@ def main(
         uploads = load_file_list(file_list)
     else:
         logging.info("Auto mode: listing uploads for %s since %s", commons_user, since)
-        uploads, _ = client.list_uploads(commons_user, since=since)
+        # Only titles are needed here: the URL to restore comes from the previous revision.
+        uploads, _ = client.list_uploads(commons_user, since=since, fields=())
         # For each upload, set URL to previous revision
         for u in uploads:
             prev_url = client.get_previous_revision_url(u.title)
             u.url = prev_url
 
     progress = tqdm(total=len(uploads), unit="file", desc="Restoring", colour="blue")
-    timestamps = []
     success = 0
     errors = 0
     for u in uploads:
@@ -94,8 +98,10 @@ def main(
                 progress.write(f"Could not download {u.title} (oldid={u.oldid})")
                 progress.update(1)
                 continue
-            client.upload_file(u, local, comment=comment)
-            success += 1
+            if client.upload_file(u, local, comment=comment):
+                success += 1
+            else:
+                progress.write(f"{u.title} already matches that version")
         except Exception as exc:
             errors += 1
             progress.write(f"Error restoring {u.title}: {exc}")
@@ -104,14 +110,10 @@ def main(
             if 'local' in locals() and local:
                 client.cleanup_file(local)
         progress.update(1)
-        now = time.time()
-        timestamps = [t for t in timestamps if now - t < 60]
-        if len(timestamps) >= max_per_min:
-            time.sleep(60 - (now - timestamps[0]))
-        timestamps.append(time.time())
     progress.close()
     client.cleanup()
     print(f"Done. Restored: {success}, errors: {errors}")
+    print(client.stats_summary())
 
 
 if __name__ == "__main__":
@@ -1,70 +1,303 @@
 from __future__ import annotations
 
 import json
-import os
+import sqlite3
 import time
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Optional
-from tempfile import NamedTemporaryFile
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set
 from datetime import datetime
 import logging
 
 from tqdm import tqdm
 
-from commons_client import CommonsClient, UploadInfo
+from commons_client import (
+    CategoryFrontier,
+    CategoryPlan,
+    CommonsClient,
+    TitleSet,
+    UploadInfo,
+    FIELD_AUTHOR,
+    FIELD_COORDS,
+    FIELD_EXIF_GPS,
+)
+from state_store import (
+    StateStore,
+    STATUS_DONE,
+    STATUS_NEEDS_EXIF,
+    STATUS_NEEDS_TEMPLATE,
+    STATUS_SKIPPED,
+)
 
 
 @dataclass
 class ScanState:
-    needs_exif: List[UploadInfo] = field(default_factory=list)
+    """Files found by a scan, keyed by title, plus the listing continuation token.
+
+    Mutate through the methods below: each one writes a single row to the
+    attached SQLite store, and ``save_state`` commits whatever is pending.
+    """
+
+    needs_exif: Dict[str, UploadInfo] = field(default_factory=dict)
     needs_template: List[str] = field(default_factory=list)
     scan_continue: Optional[dict] = None
+    # {"source", "timestamp"} of the newest upload covered by the last complete pass,
+    # and the one captured when the pass in progress started (committed when it ends).
+    scan_watermark: Optional[dict] = None
+    pass_watermark: Optional[dict] = None
+    # {"source", "frontier"} of an unfinished category walk (see CategoryFrontier).
+    category_scan: Optional[dict] = None
+    store: Optional[StateStore] = field(default=None, repr=False, compare=False)
+    _template_titles: Set[str] = field(default_factory=set, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.needs_template = list(dict.fromkeys(self.needs_template))
+        self._template_titles = set(self.needs_template)
 
     def to_dict(self):
         return {
-            "needs_exif": [u.to_dict() for u in self.needs_exif],
+            "needs_exif": [u.to_dict() for u in self.needs_exif.values()],
             "needs_template": list(self.needs_template),
             "scan_continue": self.scan_continue,
+            "scan_watermark": self.scan_watermark,
+            "pass_watermark": self.pass_watermark,
+            "category_scan": self.category_scan,
         }
 
     @staticmethod
     def from_dict(data: Optional[dict]) -> "ScanState":
         if not data:
             return ScanState()
-        needs_exif = [
-            UploadInfo.from_dict(item) for item in data.get("needs_exif", [])
-        ]
+        needs_exif = {}
+        for item in data.get("needs_exif", []):
+            upload = UploadInfo.from_dict(item)
+            needs_exif[upload.title] = upload
         needs_template = data.get("needs_template", [])
-        scan_continue = data.get("scan_continue")
-        return ScanState(needs_exif=needs_exif, needs_template=needs_template, scan_continue=scan_continue)
+        return ScanState(
+            needs_exif=needs_exif,
+            needs_template=needs_template,
+            scan_continue=data.get("scan_continue"),
+            scan_watermark=data.get("scan_watermark"),
+            pass_watermark=data.get("pass_watermark"),
+            category_scan=data.get("category_scan"),
+        )
+
+    @staticmethod
+    def from_store(store: StateStore) -> "ScanState":
+        needs_exif = {title: UploadInfo.from_dict(data) for title, data in store.iter_status(STATUS_NEEDS_EXIF)}
+        needs_template = [title for title, _ in store.iter_status(STATUS_NEEDS_TEMPLATE)]
+        return ScanState(
+            needs_exif=needs_exif,
+            needs_template=needs_template,
+            scan_continue=store.get_meta("scan_continue"),
+            scan_watermark=store.get_meta("scan_watermark"),
+            pass_watermark=store.get_meta("pass_watermark"),
+            category_scan=store.get_meta("category_scan"),
+            store=store,
+        )
+
+    def add_needs_exif(self, upload: UploadInfo):
+        self.needs_exif[upload.title] = upload
+        if self.store:
+            self.store.put(upload.title, STATUS_NEEDS_EXIF, upload.to_dict())
+
+    def add_needs_template(self, title: str):
+        # Relisted files (e.g. the upload at an inclusive watermark) are recorded once.
+        if title in self._template_titles:
+            return
+        self._template_titles.add(title)
+        self.needs_template.append(title)
+        if self.store:
+            self.store.put(title, STATUS_NEEDS_TEMPLATE)
+
+    def resolve(self, title: str, status: str = STATUS_DONE):
+        """Drop a file from ``needs_exif``, recording why (done, skipped, failed)."""
+        if self.needs_exif.pop(title, None) is not None and self.store:
+            self.store.set_status(title, status)
+
+    def set_continue(self, token: Optional[dict]):
+        self.scan_continue = token
+        if self.store:
+            self.store.set_meta("scan_continue", token)
+
+    def set_watermarks(self, scan_watermark: Optional[dict], pass_watermark: Optional[dict]):
+        self.scan_watermark = scan_watermark
+        self.pass_watermark = pass_watermark
+        if self.store:
+            self.store.set_meta("scan_watermark", scan_watermark)
+            self.store.set_meta("pass_watermark", pass_watermark)
+
+    def set_category_scan(self, category_scan: Optional[dict]):
+        self.category_scan = category_scan
+        if self.store:
+            self.store.set_meta("category_scan", category_scan)
+
+    def replace(self, needs_exif: Iterable[UploadInfo], needs_template: Iterable[str]):
+        """Start over with the given lists, dropping any stored scan progress."""
+        self.needs_exif = {u.title: u for u in needs_exif}
+        self.needs_template = list(dict.fromkeys(needs_template))
+        self._template_titles = set(self.needs_template)
+        self.scan_continue = None
+        self.scan_watermark = self.pass_watermark = None
+        self.category_scan = None
+        if self.store:
+            self._write_snapshot()
+
+    def close(self):
+        if self.store:
+            self.store.close()
+            self.store = None
+
+    def _write_snapshot(self):
+        self.store.clear()
+        self.store.put_many((u.title, STATUS_NEEDS_EXIF, u.to_dict()) for u in self.needs_exif.values())
+        self.store.put_many((title, STATUS_NEEDS_TEMPLATE, None) for title in self.needs_template)
+        self.store.set_meta("scan_continue", self.scan_continue)
+        self.store.set_meta("scan_watermark", self.scan_watermark)
+        self.store.set_meta("pass_watermark", self.pass_watermark)
+        self.store.set_meta("category_scan", self.category_scan)
+
+
+def state_db_path(path: Path) -> Path:
+    """``--state-file`` may name the database or a legacy JSON file next to it."""
+    return path if path.suffix == ".db" else path.with_suffix(".db")
+
+
+def _import_json_state(json_path: Path, store: StateStore) -> bool:
+    try:
+        with json_path.open() as fh:
+            state = ScanState.from_dict(json.load(fh))
+    except json.JSONDecodeError:
+        ts = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+        backup = json_path.with_suffix(json_path.suffix + f".corrupt.{ts}.bak")
+        json_path.rename(backup)
+        logging.warning("Corrupted state file moved to %s, starting fresh.", backup)
+        return False
+    state.store = store
+    state._write_snapshot()
+    store.commit()
+    migrated = json_path.with_suffix(json_path.suffix + ".migrated")
+    json_path.rename(migrated)
+    logging.info(
+        "Imported %s into %s (%s need EXIF, %s need template); original kept as %s.",
+        json_path,
+        store.path,
+        len(state.needs_exif),
+        len(state.needs_template),
+        migrated,
+    )
+    return True
+
+
+def _open_store(db_path: Path) -> StateStore:
+    try:
+        store = StateStore(db_path)
+        store.get_meta("scan_continue")
+        return store
+    except sqlite3.DatabaseError:
+        ts = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+        backup = db_path.with_suffix(db_path.suffix + f".corrupt.{ts}.bak")
+        db_path.rename(backup)
+        logging.warning("Corrupted state file moved to %s, starting fresh.", backup)
+        return StateStore(db_path)
 
 
 def load_state(path: Path) -> ScanState:
-    if path.exists():
-        try:
-            with path.open() as fh:
-                return ScanState.from_dict(json.load(fh))
-        except json.JSONDecodeError:
-            ts = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-            backup = path.with_suffix(path.suffix + f".corrupt.{ts}.bak")
-            path.rename(backup)
-            logging.warning("Corrupted state file moved to %s, starting fresh.", backup)
-    return ScanState()
+    db_path = state_db_path(path)
+    legacy = db_path.with_suffix(".json")
+    fresh = not db_path.exists()
+    store = _open_store(db_path)
+    if fresh and legacy.exists():
+        _import_json_state(legacy, store)
+    return ScanState.from_store(store)
 
 
 def save_state(path: Path, state: ScanState):
-    tmp = NamedTemporaryFile("w", delete=False, dir=path.parent or Path("."))
-    try:
-        json.dump(state.to_dict(), tmp, indent=2)
-        tmp.flush()
-        os.fsync(tmp.fileno())
-        os.replace(tmp.name, path)
-    finally:
-        try:
-            tmp.close()
-        except Exception:
-            pass
+    """Commit pending state changes; a state without a store is written out in full."""
+    if state.store is None:
+        state.store = _open_store(state_db_path(path))
+        state._write_snapshot()
+    state.store.commit()
+
+
+def scan_fields(author_filter: Optional[str] = None) -> FrozenSet[str]:
+    """Fields the scan needs: GPS flags, plus author only when filtering on it.
+
+    The download URL is left out; ``download_with_gps`` derives it from the title.
+    """
+    fields = {FIELD_COORDS, FIELD_EXIF_GPS}
+    if author_filter:
+        fields.add(FIELD_AUTHOR)
+    return frozenset(fields)
+
+
+def _begin_uploader_pass(
+    client: CommonsClient,
+    target_user: str,
+    state: ScanState,
+    state_path: Path,
+    author_filter: Optional[str],
+    generator: bool,
+) -> Optional[str]:
+    """Return the timestamp to list uploads back to, or None for a full scan.
+
+    A new pass records the uploader's newest upload before listing starts, so
+    files uploaded while it runs are picked up by the next pass. Watermarks only
+    apply to the same uploader, listing mode and author filter.
+    """
+    source = f"{'allimages' if generator else 'log'}:{target_user}:{author_filter or ''}"
+    pending = state.pass_watermark
+    # An interrupted pass of the same listing keeps its watermark and its lower bound.
+    if state.scan_continue is None or not pending or pending.get("source") != source:
+        if pending and pending.get("source") != source:
+            # The stored continuation belongs to a different listing.
+            state.set_continue(None)
+        newest = client.latest_upload_timestamp(target_user, generator=generator)
+        state.set_watermarks(state.scan_watermark, {"source": source, "timestamp": newest} if newest else None)
+        save_state(state_path, state)
+    committed = state.scan_watermark
+    if committed and committed.get("source") == source:
+        return committed.get("timestamp")
+    return None
+
+
+def _category_frontier(
+    state: ScanState,
+    category: str,
+    max_depth: int,
+    author_filter: Optional[str],
+    generator: bool,
+    plan: Optional[CategoryPlan],
+) -> CategoryFrontier:
+    """Resume the saved walk of the same category listing, or start a new one."""
+    source = f"{'generator' if generator else 'list'}:{category}:{max_depth}:{author_filter or ''}"
+    saved = state.category_scan
+    if saved and saved.get("source") == source and saved.get("frontier"):
+        frontier = CategoryFrontier.from_dict(saved["frontier"])
+        logging.info(
+            "Resuming category scan: %s category pages queued, %s categories seen.",
+            len(frontier.pending),
+            len(frontier.visited),
+        )
+        return frontier
+    frontier = CategoryFrontier.from_plan(plan) if plan else CategoryFrontier.start(category)
+    state.set_category_scan({"source": source, "frontier": frontier.to_dict()})
+    return frontier
+
+
+def describe_category_plan(plan: CategoryPlan, top: int = 5) -> List[str]:
+    """Human-readable summary of a category plan for operators sizing a run."""
+    lines = [
+        f"Category:{plan.root} to depth {plan.max_depth}: {len(plan.depth)} categories, "
+        f"{len(plan.listing_order())} with files, up to {plan.total_files} files, "
+        f"~{plan.estimated_requests()} API requests to list and fetch metadata."
+    ]
+    for depth, categories, files in plan.summary_by_depth():
+        lines.append(f"  depth {depth}: {categories} categories, {files} files")
+    branches = sorted((c for c, d in plan.depth.items() if d == 1), key=lambda c: -plan.branch_files[c])[:top]
+    for category in branches:
+        lines.append(f"  branch {category}: {plan.branch_files[category]} files")
+    return lines
 
 
 def scan_user_uploads(
@@ -75,38 +308,82 @@ def scan_user_uploads(
     category: Optional[str] = None,
     max_depth: int = 1,
     author_filter: Optional[str] = None,
+    generator: bool = False,
+    plan: Optional[CategoryPlan] = None,
 ) -> ScanState:
-    seen_titles = {u.title for u in state.needs_exif} | set(state.needs_template)
+    """Record JPEGs needing EXIF GPS or a location template from an uploader or category.
+
+    For categories, a ``plan`` from ``CommonsClient.plan_category_tree`` limits
+    listing to categories that hold files and sizes the progress bar.
+    """
+    seen_titles = TitleSet(state.needs_exif)
+    seen_titles.update(state.needs_template)
     cont = state.scan_continue
     # Clean any stale entries without coords before processing
-    state.needs_exif = [u for u in state.needs_exif if u.has_coords]
-    if state.needs_exif and state.needs_template and not cont:
-        return state
-
-    logging.info("Scanning uploads for %s...", target_user if not category else f"category {category}")
-    progress = tqdm(total=None, unit="file", desc="Scanning", colour="cyan")
-    while True:
-        if category:
-            uploads = client.list_category_files(category, max_depth=max_depth, seen_titles=seen_titles)
-            cont = None
-        else:
-            uploads, cont = client.list_uploads(target_user, cont_token=cont, seen_titles=seen_titles)
-        progress.update(len(uploads))
-        for upload in uploads:
-            if not upload.title.lower().endswith((".jpg", ".jpeg")):
-                continue
-            if author_filter and upload.author and author_filter.lower() not in upload.author.lower():
-                continue
-            if upload.has_coords and not upload.has_exif_gps:
-                state.needs_exif.append(upload)
-            elif upload.has_exif_gps and not upload.has_coords:
-                state.needs_template.append(upload.title)
-            seen_titles.add(upload.title)
-        state.scan_continue = cont
+    for upload in [u for u in state.needs_exif.values() if not u.has_coords]:
+        state.resolve(upload.title, STATUS_SKIPPED)
+
+    since = None
+    frontier: Optional[CategoryFrontier] = None
+    if category:
+        frontier = _category_frontier(state, category, max_depth, author_filter, generator, plan)
+    else:
+        since = _begin_uploader_pass(client, target_user, state, state_path, author_filter, generator)
+        cont = state.scan_continue
+        if cont is None and since and state.pass_watermark and state.pass_watermark.get("timestamp") == since:
+            # Nothing uploaded since the last pass; skip listing entirely.
+            state.set_watermarks(state.pass_watermark, None)
+            save_state(state_path, state)
+            return state
+
+    if since:
+        logging.info("Scanning uploads for %s newer than %s...", target_user, since)
+    else:
+        logging.info("Scanning uploads for %s...", target_user if not category else f"category {category}")
+    progress = tqdm(total=plan.total_files if plan else None, unit="file", desc="Scanning", colour="cyan")
+    fields = scan_fields(author_filter)
+    def checkpoint(walked: CategoryFrontier):
+        # Every file listed before ``walked`` is recorded, including rounds that only found subcategories.
+        state.set_category_scan(dict(state.category_scan, frontier=walked.to_dict()))
         save_state(state_path, state)
-        if not cont or not uploads:
-            break
-        time.sleep(1)
+
+    if category:
+        stream = client.iter_category_files(
+            category,
+            max_depth=max_depth,
+            seen_titles=seen_titles,
+            fields=fields,
+            generator=generator,
+            frontier=frontier,
+            checkpoint=checkpoint,
+        )
+    else:
+        stream = client.iter_uploads(
+            target_user, cont_token=cont, seen_titles=seen_titles, since=since, fields=fields, generator=generator
+        )
+    page_token = cont
+    for upload, token in stream:
+        if not category and token != page_token:
+            # Everything from earlier pages is recorded; a rerun resumes at this page.
+            state.set_continue(token)
+            save_state(state_path, state)
+            page_token = token
+        progress.update(1)
+        if not upload.title.lower().endswith((".jpg", ".jpeg")):
+            continue
+        if author_filter and upload.author and author_filter.lower() not in upload.author.lower():
+            continue
+        if upload.has_coords and not upload.has_exif_gps:
+            state.add_needs_exif(upload)
+        elif upload.has_exif_gps and not upload.has_coords:
+            state.add_needs_template(upload.title)
+    state.set_continue(None)
+    if category:
+        state.set_category_scan(None)
+    else:
+        # Only a finished pass moves the watermark; an interrupted one resumes with the old one.
+        state.set_watermarks(state.pass_watermark or state.scan_watermark, None)
+    save_state(state_path, state)
     progress.close()
 
     logging.info(
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional, Tuple
+
+STATUS_NEEDS_EXIF = "needs_exif"
+STATUS_NEEDS_TEMPLATE = "needs_template"
+STATUS_DONE = "done"
+STATUS_SKIPPED = "skipped"
+STATUS_FAILED = "failed"
+
+
+class StateStore:
+    """SQLite table of scanned files keyed by title, with a status per file.
+
+    Every update is a single-row statement; ``commit`` makes the pending ones
+    durable, so recording one processed file costs the same at 10 or 100k entries.
+    Scalar scan state (the continuation token) lives in the ``meta`` table as JSON.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                title TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                data TEXT
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS files_status ON files (status)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
+
+    def commit(self):
+        self._conn.commit()
+
+    def put(self, title: str, status: str, data: Optional[dict] = None):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO files (title, status, data) VALUES (?, ?, ?)",
+            (title, status, json.dumps(data) if data is not None else None),
+        )
+
+    def put_many(self, rows: Iterable[Tuple[str, str, Optional[dict]]]):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO files (title, status, data) VALUES (?, ?, ?)",
+            ((title, status, json.dumps(data) if data is not None else None) for title, status, data in rows),
+        )
+
+    def set_status(self, title: str, status: str):
+        self._conn.execute("UPDATE files SET status = ? WHERE title = ?", (status, title))
+
+    def iter_status(self, status: str) -> Iterator[Tuple[str, Optional[dict]]]:
+        cursor = self._conn.execute("SELECT title, data FROM files WHERE status = ? ORDER BY rowid", (status,))
+        for title, data in cursor:
+            yield title, json.loads(data) if data is not None else None
+
+    def clear(self):
+        self._conn.execute("DELETE FROM files")
+        self._conn.execute("DELETE FROM meta")
+
+    def get_meta(self, key: str) -> Any:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_meta(self, key: str, value: Any):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
@@ -17,7 +17,7 @@ try:
 except ImportError:
     argostranslate = None  # type: ignore
 
-from commons_client import CommonsClient
+from commons_client import CommonsClient, FIELD_DESCRIPTION
 
 app = typer.Typer(add_completion=False)
 
@@ -146,6 +146,8 @@ def main(
     apply: bool = typer.Option(False, "--apply", help="Apply edits (default: dry-run)"),
     log_csv: Optional[Path] = typer.Option(None, "--log-csv", help="Optional CSV log of actions"),
     max_edits: Optional[int] = typer.Option(None, "--max-edits", help="Stop after this many updates; process all if omitted"),
+    cache_file: Optional[Path] = typer.Option(None, "--cache-file", help="SQLite cache of page metadata/wikitext, revalidated by revision id (off by default)"),
+    generator: bool = typer.Option(False, "--generator", help="Scan with API generators (listing and metadata in one request stream)"),
 ):
     """Translate descriptions for files in a category and optionally update wikitext.
 
@@ -170,11 +172,11 @@ def main(
     if not commons_user or not commons_pass:
         raise typer.Exit("COMMONS_USER and COMMONS_PASS must be set in env.")
 
-    client = CommonsClient(commons_user, commons_pass)
-    uploads = client.list_category_files(category, max_depth=1)
-    # Filter JPEGs only
-    uploads = [u for u in uploads if u.title.lower().endswith((".jpg", ".jpeg"))]
-    progress = tqdm(total=len(uploads), desc="Translating", unit="file", colour="magenta")
+    client = CommonsClient(commons_user, commons_pass, cache_path=str(cache_file) if cache_file else None)
+    listing = client.iter_category_files(category, max_depth=1, fields={FIELD_DESCRIPTION}, generator=generator)
+    # Filter JPEGs only; files are streamed as listing batches arrive
+    uploads = (u for u, _ in listing if u.title.lower().endswith((".jpg", ".jpeg")))
+    progress = tqdm(total=None, desc="Translating", unit="file", colour="magenta")
     updated = 0
     skipped = 0
     errors = 0
@@ -199,11 +201,14 @@ def main(
                     writer.writeheader()
                 writer.writerow(log_rows[-1])
     try:
-        for u in uploads:
+        # Wikitext is prefetched for the next 50 files while the current ones are translated
+        for u, rev in client.iter_with_wikitext(uploads):
             try:
                 full_title = u.title if u.title.startswith("File:") else f"File:{u.title}"
-                page = client._site.pages[full_title]  # type: ignore
-                text = client.fetch_wikitext(u.title) or page.text()
+                if rev is None or not rev[2]:
+                    # Editing without the current text and its timestamp could overwrite the page.
+                    raise RuntimeError("could not read current wikitext")
+                text, _revid, rev_ts = rev
                 base_desc = None
                 lang_map = {}
                 target_match = None
@@ -318,7 +323,14 @@ def main(
                     continue
                 if apply:
                     try:
-                        page.save(new_text, summary=f"Add machine translation ({','.join(targets)}) to description")
+                        saved = client.edit_page(
+                            full_title,
+                            new_text,
+                            summary=f"Add machine translation ({','.join(targets)}) to description",
+                            basetimestamp=rev_ts,
+                        )
+                        if not saved:
+                            raise RuntimeError("edit was not saved")
                         updated += 1
                         add_log(u.title, "updated", "", source="wikitext/extmeta/SDC", desc=base_desc)
                     except mwclient.errors.APIError as e:
@@ -352,6 +364,7 @@ def main(
     progress.close()
     client.cleanup()
     print(f"Done. Updated (or previewed): {updated}, skipped: {skipped}, errors: {errors}")
+    print(client.stats_summary())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import logging
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+from commons_client import CommonsClient
+from processor import DEFAULT_DOWNLOAD_WORKERS, DEFAULT_PREFETCH, process_needs_exif
+from scanner import ScanState, scan_user_uploads
+
+DEFAULT_POLL_MIN = 60.0
+DEFAULT_POLL_MAX = 900.0
+
+
+def next_poll_interval(current: float, busy: bool, poll_min: float, poll_max: float) -> float:
+    """Poll again soon after activity or while work is pending; double the wait (up to ``poll_max``) while idle."""
+    if busy:
+        return poll_min
+    return min(poll_max, max(poll_min, current * 2))
+
+
+def watch_uploads(
+    client: CommonsClient,
+    target_user: str,
+    state: ScanState,
+    state_path: Path,
+    count: int,
+    upload: bool,
+    author_filter: Optional[str] = None,
+    generator: bool = False,
+    download_workers: int = DEFAULT_DOWNLOAD_WORKERS,
+    prefetch: int = DEFAULT_PREFETCH,
+    poll_min: float = DEFAULT_POLL_MIN,
+    poll_max: float = DEFAULT_POLL_MAX,
+    max_cycles: Optional[int] = None,
+) -> Tuple[int, int, int, int]:
+    """Poll ``target_user``'s uploads and geotag new files as they appear.
+
+    Each cycle is an incremental scan from the stored upload watermark (one
+    request when nothing is new) followed by ``process_needs_exif`` with at most
+    ``count`` edits. Runs until interrupted or ``max_cycles`` cycles have run and
+    returns the summed (updated, skipped_has_gps, skipped_no_gps, errors).
+    ``upload`` must be True: files are marked done once processed.
+    """
+    if not upload:
+        raise ValueError("watch_uploads marks processed files done, so it needs upload=True")
+    totals = [0, 0, 0, 0]
+    interval = poll_min
+    cycle = 0
+    try:
+        while max_cycles is None or cycle < max_cycles:
+            cycle += 1
+            n_exif = len(state.needs_exif)
+            n_template = len(state.needs_template)
+            scan_user_uploads(
+                client,
+                target_user,
+                state,
+                state_path,
+                author_filter=author_filter,
+                generator=generator,
+            )
+            new_exif = len(state.needs_exif) - n_exif
+            new_template = len(state.needs_template) - n_template
+            if state.needs_exif:
+                result = process_needs_exif(
+                    client=client,
+                    state=state,
+                    state_path=state_path,
+                    count=count,
+                    upload=upload,
+                    download_workers=download_workers,
+                    prefetch=prefetch,
+                )
+                totals = [t + r for t, r in zip(totals, result)]
+            # Files left over by the ``count`` limit keep the short interval until drained.
+            busy = bool(new_exif or new_template or state.needs_exif)
+            interval = next_poll_interval(interval, busy, poll_min, poll_max)
+            logging.info(
+                "Watch cycle %s: %s new file(s) need EXIF, %s need template, %s pending. Next poll in %.0fs.",
+                cycle,
+                new_exif,
+                new_template,
+                len(state.needs_exif),
+                interval,
+            )
+            if max_cycles is not None and cycle >= max_cycles:
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        logging.info("Watch stopped after %s cycle(s).", cycle)
+    updated, skipped_has_gps, skipped_no_gps, errors = totals
+    return updated, skipped_has_gps, skipped_no_gps, errors